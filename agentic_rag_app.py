@@ -14,15 +14,33 @@ Author: Enhanced Agentic RAG Team
 Version: 4.0
 """
 
+import io
+import gc
 import os
+import re
+import ast
+import sys
 import json
+import math
+import uuid
+import hashlib
+import queue
+import atexit
+import socket
 import logging
-from typing import List, Dict, Tuple, Optional, Any
-from dataclasses import dataclass, asdict
+import threading
+import traceback
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Dict, Tuple, Optional, Any, Deque
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 import warnings
-from collections import Counter
+import functools
+import itertools
+from operator import attrgetter
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Force UTF-8 encoding to handle emojis in logs/metadata
 os.environ.setdefault('PYTHONIOENCODING', 'utf-8')
@@ -35,10 +53,20 @@ from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain.memory import ConversationBufferMemory
 # Import text splitter - LangChain 0.1.0+ uses separate package
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+# Vector index
+import faiss
+import numpy as np
+
+# GPU FAISS (faiss-gpu builds only)
+FAISS_GPU_AVAILABLE = hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0
 
 # Document loaders
 from langchain_community.document_loaders import (
@@ -58,18 +86,35 @@ try:
 except ImportError:
     TAVILY_AVAILABLE = False
 
-# PCAP parsing
+# PCAP parsing - dpkt is the fast path, Scapy the fallback
+try:
+    import dpkt
+    DPKT_AVAILABLE = True
+except ImportError:
+    DPKT_AVAILABLE = False
+
 try:
-    from scapy.all import rdpcap, IP, TCP, UDP
+    from scapy.all import PcapReader, IP, TCP, UDP
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
-    print("⚠️  Scapy not available. Install: pip install scapy")
+    if not DPKT_AVAILABLE:
+        print("⚠️  Scapy not available. Install: pip install scapy")
+
+# Fast JSON serialization (optional)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Gradio
 import gradio as gr
 
-# Configure logging
+# Configure logging (the format never shows thread/process fields, so skip collecting them)
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -78,6 +123,22 @@ logging.basicConfig(
         logging.StreamHandler()
     ]
 )
+
+
+def enable_queue_logging():
+    """Hand root log records to a queue; a background thread does the actual I/O."""
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return  # Already routed through a queue (e.g. by app.py)
+    
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    atexit.register(listener.stop)
+
+
+enable_queue_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -85,24 +146,41 @@ logger = logging.getLogger(__name__)
 # 📊 Data Classes
 # ═══════════════════════════════════════════════════════════════════
 
-@dataclass
+# __slots__ dataclasses need Python 3.10+; older interpreters get a regular one
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**DATACLASS_SLOTS)
 class InteractionLog:
     """Log entry for each user interaction."""
     timestamp: str
     query: str
     response: str
-    agent_steps: List[Dict]
+    agent_steps: List[Dict]  # Full trace only when reasoning was requested; else empty
     tools_used: List[str]
     feedback: Optional[str] = None
     feedback_timestamp: Optional[str] = None
+    num_steps: int = 0
     
     def to_dict(self) -> Dict:
         """Convert to dictionary for JSON serialization."""
-        return asdict(self)
+        # Built by hand: asdict() deep-copies every nested step dict
+        return {
+            'timestamp': self.timestamp,
+            'query': self.query,
+            'response': self.response,
+            'agent_steps': self.agent_steps,
+            'tools_used': self.tools_used,
+            'feedback': self.feedback,
+            'feedback_timestamp': self.feedback_timestamp,
+            'num_steps': self.num_steps
+        }
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'InteractionLog':
         """Create from dictionary."""
+        if 'num_steps' not in data:  # Records written before num_steps existed
+            data = {**data, 'num_steps': len(data.get('agent_steps') or ())}
         return cls(**data)
 
 
@@ -110,91 +188,323 @@ class InteractionLog:
 # 🧠 Memory Manager (JSON-based, secure)
 # ═══════════════════════════════════════════════════════════════════
 
+def _dump_json(record: Dict) -> bytes:
+    """Serialize one record as compact UTF-8 JSON."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(record)
+    return json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+
+def _dump_json_line(record: Dict) -> bytes:
+    """Serialize one record as a UTF-8 JSON line."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+def _load_json(data: bytes) -> Any:
+    """Parse JSON bytes with orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 class MemoryManager:
-    """Manages conversation memory and interaction history."""
+    """
+    Manages conversation memory and interaction history.
+    
+    History is stored as append-only JSON Lines: each turn appends one record
+    on a background writer thread. The file is rewritten in full (compacted)
+    when existing records change (feedback or clear) and once it holds more
+    than twice MAX_HISTORY records, so it stays bounded between restarts.
+    
+    In memory only the newest MAX_HISTORY interactions are kept. Interaction
+    ids keep increasing as old entries are evicted, so an id handed out to the
+    UI always refers to the same interaction.
+    
+    All access to the history goes through one lock; readers get snapshots,
+    so concurrent appends never invalidate an iteration in progress.
+    """
+    
+    HISTORY_FILE = "interaction_history.jsonl"
+    LEGACY_HISTORY_FILE = "interaction_history.json"
+    MAX_HISTORY = 10_000
     
     def __init__(self, memory_path: str = "memory_store"):
         """Initialize memory management system."""
         self.memory_path = Path(memory_path)
         self.memory_path.mkdir(exist_ok=True)
+        self.history_file = self.memory_path / self.HISTORY_FILE
+        
+        # Guards interaction_history, _next_id and version
+        self._lock = threading.RLock()
+        
+        # Records in the history file, including ones evicted from memory
+        self._records_on_disk = 0
+        
+        # Single worker keeps writes ordered
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
         
-        # Long-term interaction history
-        self.interaction_history: List[InteractionLog] = []
+        # Long-term interaction history (bounded window)
+        self.interaction_history: Deque[InteractionLog] = deque(maxlen=self.MAX_HISTORY)
         
         # Load existing memory
         self._load_memory()
         
+        # Id of the next interaction; ids of loaded entries are 0..len-1
+        self._next_id = len(self.interaction_history)
+        
+        # Bumped on every change to the history (cache key for derived views)
+        self.version = 0
+        
         logger.info("🧠 Memory Manager initialized")
     
     def add_interaction(self, query: str, response: str, 
-                       agent_steps: List[Dict], tools_used: List[str]):
-        """Add a new interaction to memory."""
+                       agent_steps: List[Dict], tools_used: List[str],
+                       num_steps: Optional[int] = None) -> int:
+        """Add a new interaction to memory and return its id (num_steps defaults to len(agent_steps))."""
         interaction = InteractionLog(
             timestamp=datetime.now().isoformat(),
             query=query,
             response=response,
             agent_steps=agent_steps,
-            tools_used=tools_used
+            tools_used=tools_used,
+            num_steps=len(agent_steps) if num_steps is None else num_steps
         )
-        self.interaction_history.append(interaction)
-        
-        # Save after every interaction
-        self._save_memory()
+        with self._lock:
+            self.interaction_history.append(interaction)
+            interaction_id = self._next_id
+            self._next_id += 1
+            self.version += 1
+            total = len(self.interaction_history)
+            
+            # Append only the new record, off the request path (submitted under
+            # the lock so it is ordered with any compaction); once evicted
+            # records dominate the file, compact it instead
+            self._records_on_disk += 1
+            if self._records_on_disk > 2 * self.MAX_HISTORY:
+                self._save_memory()
+            else:
+                self._writer.submit(self._append_record, interaction.to_dict())
         
-        logger.info(f"💾 Interaction saved (total: {len(self.interaction_history)})")
+        logger.info("💾 Interaction saved (total: %s)", total)
+        return interaction_id
+    
+    @property
+    def last_interaction_id(self) -> int:
+        """Id of the most recent interaction (-1 if none yet)."""
+        with self._lock:
+            return self._next_id - 1
+    
+    def snapshot(self) -> Tuple[InteractionLog, ...]:
+        """Consistent copy of the current history, oldest first."""
+        with self._lock:
+            return tuple(self.interaction_history)
     
-    def add_feedback(self, interaction_index: int, feedback: str):
+    def get_recent(self, n: int) -> List[InteractionLog]:
+        """Return the last n interactions, oldest first (walks only those n from the right)."""
+        with self._lock:
+            recent = list(itertools.islice(reversed(self.interaction_history), max(0, n)))
+        recent.reverse()
+        return recent
+    
+    def add_feedback(self, interaction_id: int, feedback: str):
         """Add user feedback to a specific interaction."""
-        if 0 <= interaction_index < len(self.interaction_history):
-            self.interaction_history[interaction_index].feedback = feedback
-            self.interaction_history[interaction_index].feedback_timestamp = datetime.now().isoformat()
+        with self._lock:
+            # Ids are stable; translate to a position in the current window
+            index = interaction_id - (self._next_id - len(self.interaction_history))
+            if not 0 <= index < len(self.interaction_history):
+                return
+            interaction = self.interaction_history[index]
+            interaction.feedback = feedback
+            interaction.feedback_timestamp = datetime.now().isoformat()
+            self.version += 1
             self._save_memory()
-            logger.info(f"👍/👎 Feedback added to interaction {interaction_index}")
+        logger.info("👍/👎 Feedback added to interaction %s", interaction_id)
     
     def clear_memory(self):
         """Clear all interaction history."""
-        self.interaction_history = []
-        self._save_memory()
+        with self._lock:
+            self.interaction_history.clear()
+            # _next_id keeps counting: ids still held by open tabs must not match new turns
+            self.version += 1
+            self._save_memory()
         logger.info("🗑️ All conversation history cleared")
     
+    def flush(self):
+        """Block until all queued writes have reached disk."""
+        self._writer.submit(lambda: None).result()
+    
     def _save_memory(self):
-        """Save interaction history to disk using JSON."""
-        history_file = self.memory_path / "interaction_history.json"
+        """Compact: rewrite the whole history file in the background."""
+        with self._lock:
+            records = [interaction.to_dict() for interaction in self.interaction_history]
+            self._records_on_disk = len(records)
+            self._writer.submit(self._write_records, records)
+    
+    def _append_record(self, record: Dict):
+        """Append a single record to the history file (writer thread)."""
         try:
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(
-                    [interaction.to_dict() for interaction in self.interaction_history],
-                    f,
-                    indent=2,
-                    ensure_ascii=False
-                )
-            logger.debug(f"💾 Memory saved to {history_file}")
+            with open(self.history_file, 'ab') as f:
+                f.write(_dump_json_line(record))
+        except Exception as e:
+            logger.error("❌ Failed to save memory: %s", e)
+    
+    def _write_records(self, records: List[Dict]):
+        """Atomically replace the history file with records (writer thread)."""
+        tmp_file = self.history_file.with_suffix('.jsonl.tmp')
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(b''.join(_dump_json_line(record) for record in records))
+            os.replace(tmp_file, self.history_file)
+            logger.debug("💾 Memory saved to %s", self.history_file)
         except Exception as e:
-            logger.error(f"❌ Failed to save memory: {e}")
+            logger.error("❌ Failed to save memory: %s", e)
     
     def _load_memory(self):
         """Load interaction history from disk."""
-        history_file = self.memory_path / "interaction_history.json"
-        if history_file.exists():
+        legacy_file = self.memory_path / self.LEGACY_HISTORY_FILE
+        
+        if self.history_file.exists():
             try:
-                with open(history_file, 'r', encoding='utf-8') as f:
+                with open(self.history_file, 'rb') as f:
+                    for line_number, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        self._records_on_disk += 1
+                        try:
+                            self.interaction_history.append(
+                                InteractionLog.from_dict(_load_json(line))
+                            )
+                        except (ValueError, TypeError) as e:
+                            # e.g. a partial last line after a crash
+                            logger.warning("⚠️ Skipping corrupt history line %s: %s", line_number, e)
+                logger.info("📂 Loaded %s past interactions", len(self.interaction_history))
+            except Exception as e:
+                logger.warning("⚠️ Could not load memory: %s", e)
+                self.interaction_history.clear()
+        
+        elif legacy_file.exists():
+            # Migrate the pre-JSONL history format
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.interaction_history = [
+                    self.interaction_history.extend(
                         InteractionLog.from_dict(item) for item in data
-                    ]
-                logger.info(f"📂 Loaded {len(self.interaction_history)} past interactions")
+                    )
+                self._save_memory()
+                logger.info("📂 Migrated %s past interactions to %s", len(self.interaction_history), self.HISTORY_FILE)
             except Exception as e:
-                logger.warning(f"⚠️ Could not load memory: {e}")
-                self.interaction_history = []
+                logger.warning("⚠️ Could not load memory: %s", e)
+                self.interaction_history.clear()
+
+
+# ═══════════════════════════════════════════════════════════════════
+# ⚡ Semantic Response Cache
+# ═══════════════════════════════════════════════════════════════════
+
+class SemanticCache:
+    """
+    Bounded cache of chat results keyed by query embedding.
+    
+    Normalized query embeddings are rows of a preallocated (capacity, dim)
+    matrix filled ring-buffer style (the oldest entry is evicted first), so a
+    lookup is a single matrix-vector product.
+    """
+    
+    def __init__(self, capacity: int = 256, threshold: float = 0.95):
+        """Initialize an empty cache."""
+        self.capacity = capacity
+        self.threshold = threshold
+        self._matrix: Optional[np.ndarray] = None  # Allocated on first add (dim unknown before)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._size = 0
+        self._next_slot = 0
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def cache_size(self) -> int:
+        """Number of cached results."""
+        return self._size
+    
+    @property
+    def cache_hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Return the embedding as a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def lookup(self, embedding: List[float], require_trace: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached result for the most similar query above threshold.
+        
+        With require_trace, a match cached without its agent reasoning (from a
+        turn that had steps) can't serve the request and counts as a miss.
+        """
+        if self._size:
+            scores = self._matrix[:self._size] @ self._normalize(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                result = self._entries[best]['result']
+                metadata = result['metadata']
+                if not (require_trace and metadata['agent_reasoning'] is None and metadata['num_steps']):
+                    self.hits += 1
+                    return result
+        self.misses += 1
+        return None
+    
+    def add(self, embedding: List[float], query: str, result: Dict[str, Any]):
+        """Cache a result, evicting the oldest entry when full."""
+        vector = self._normalize(embedding)
+        if self._matrix is None:
+            self._matrix = np.empty((self.capacity, vector.shape[0]), dtype=np.float32)
+        
+        self._matrix[self._next_slot] = vector
+        self._entries[self._next_slot] = {
+            'query': query,
+            'result': result,
+            'timestamp': datetime.now().isoformat()
+        }
+        self._next_slot = (self._next_slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+    
+    def clear(self):
+        """Drop all cached results and release the embedding matrix."""
+        self._matrix = None  # Reallocated by the next add()
+        self._entries = [None] * self.capacity
+        self._size = 0
+        self._next_slot = 0
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 📄 Multi-Format Document Loader
 # ═══════════════════════════════════════════════════════════════════
 
+# IP protocol numbers -> names (matches Scapy's %IP.proto% output)
+IP_PROTOCOL_NAMES = {
+    1: 'icmp', 2: 'igmp', 6: 'tcp', 17: 'udp', 41: 'ipv6',
+    47: 'gre', 50: 'esp', 51: 'ah', 58: 'ipv6_icmp', 132: 'sctp'
+}
+
+# pcap link types whose frames the dpkt scanner can decode; others go to Scapy
+PCAP_ETHERNET_LINKTYPES = frozenset({1})            # DLT_EN10MB
+PCAP_SLL_LINKTYPES = frozenset({113})               # DLT_LINUX_SLL
+PCAP_RAW_IP_LINKTYPES = frozenset({12, 14, 101})    # DLT_RAW (per-OS values), LINKTYPE_RAW
+PCAP_LOOPBACK_LINKTYPES = frozenset({0, 108})       # DLT_NULL, DLT_LOOP (BSD loopback)
+
+
 class MultiFormatDocumentLoader:
     """Handles loading of multiple document formats."""
     
+    PCAP_ANALYSIS_LIMIT = 1000  # Packets analyzed in detail (all packets are counted)
+    
     @staticmethod
     def load_document(file_path: str) -> Tuple[List[Document], Dict[str, Any]]:
         """
@@ -203,28 +513,29 @@ class MultiFormatDocumentLoader:
         Returns:
             Tuple of (documents, metadata)
         """
-        file_path = Path(file_path)
-        file_ext = file_path.suffix.lower()
+        file_path = str(file_path)
+        filename = os.path.basename(file_path)
+        file_ext = os.path.splitext(filename)[1].lower()
         
         try:
             if file_ext == '.pdf':
-                return MultiFormatDocumentLoader._load_pdf(str(file_path))
+                return MultiFormatDocumentLoader._load_pdf(file_path, filename)
             elif file_ext in ['.docx', '.doc']:
-                return MultiFormatDocumentLoader._load_docx(str(file_path))
+                return MultiFormatDocumentLoader._load_docx(file_path, filename)
             elif file_ext == '.txt':
-                return MultiFormatDocumentLoader._load_txt(str(file_path))
+                return MultiFormatDocumentLoader._load_txt(file_path, filename)
             elif file_ext in ['.pcap', '.pcapng']:
-                return MultiFormatDocumentLoader._load_pcap(str(file_path))
+                return MultiFormatDocumentLoader._load_pcap(file_path, filename)
             else:
                 raise ValueError(f"Unsupported file format: {file_ext}")
         except Exception as e:
-            logger.error(f"Error loading document: {e}")
+            logger.error("Error loading document: %s", e)
             raise
     
     @staticmethod
-    def _load_pdf(file_path: str) -> Tuple[List[Document], Dict[str, Any]]:
+    def _load_pdf(file_path: str, filename: str) -> Tuple[List[Document], Dict[str, Any]]:
         """Load PDF document with enhanced metadata and title page extraction."""
-        logger.info(f"📄 Loading PDF: {file_path}")
+        logger.info("📄 Loading PDF: %s", file_path)
         
         # Load pages
         loader = PyPDFLoader(file_path)
@@ -253,21 +564,21 @@ class MultiFormatDocumentLoader:
                 if 'author' in pdf_metadata:
                     author_lower = pdf_metadata['author'].lower()
                     if author_lower in bad_authors or len(pdf_metadata['author']) < 3:
-                        logger.warning(f"⚠️ Ignoring generic author metadata: '{pdf_metadata['author']}'")
+                        logger.warning("⚠️ Ignoring generic author metadata: '%s'", pdf_metadata['author'])
                         del pdf_metadata['author']
                 
                 if 'title' in pdf_metadata:
                     title_lower = pdf_metadata['title'].lower()
                     if any(bad in title_lower for bad in bad_title_patterns) or len(pdf_metadata['title']) < 5:
-                        logger.warning(f"⚠️ Ignoring generic title metadata: '{pdf_metadata['title']}'")
+                        logger.warning("⚠️ Ignoring generic title metadata: '%s'", pdf_metadata['title'])
                         del pdf_metadata['title']
                 
                 if pdf_metadata:
-                    logger.info(f"📋 Valid PDF metadata: {pdf_metadata}")
+                    logger.info("📋 Valid PDF metadata: %s", pdf_metadata)
                 else:
                     logger.info("📋 PDF metadata exists but appears invalid/generic")
         except Exception as e:
-            logger.warning(f"⚠️ Could not extract PDF metadata: {e}")
+            logger.warning("⚠️ Could not extract PDF metadata: %s", e)
         
         # Try to extract author/title from first few pages if metadata is missing/invalid
         extracted_info = {}
@@ -297,7 +608,7 @@ class MultiFormatDocumentLoader:
                     name_match = re.search(rf'([A-Z][a-z]+)\s+{last_name}', first_pages_text)
                     if name_match:
                         extracted_info['author'] = f"{name_match.group(1)} {last_name}"
-                        logger.info(f"📝 Extracted author from acknowledgments: {extracted_info['author']}")
+                        logger.info("📝 Extracted author from acknowledgments: %s", extracted_info['author'])
             
             # Try regular patterns if not found yet
             if 'author' not in extracted_info:
@@ -308,7 +619,7 @@ class MultiFormatDocumentLoader:
                         # Filter out generic names or single words
                         if len(author_name.split()) >= 2 and author_name.lower() not in ['no starch', 'press inc']:
                             extracted_info['author'] = author_name
-                            logger.info(f"📝 Extracted author from content: {extracted_info['author']}")
+                            logger.info("📝 Extracted author from content: %s", extracted_info['author'])
                             break
             
             # Look for title with multiple strategies
@@ -322,7 +633,7 @@ class MultiFormatDocumentLoader:
                         sum(c.isalpha() for c in line) > len(line) * 0.5 and
                         line.count(' ') >= 1):  # At least 2 words
                         extracted_info['title'] = line.title()  # Convert to Title Case
-                        logger.info(f"📝 Extracted title (ALL CAPS) from content: {extracted_info['title']}")
+                        logger.info("📝 Extracted title (ALL CAPS) from content: %s", extracted_info['title'])
                         break
                 
                 # Strategy 2: Look for title pattern on its own line (short, prominent)
@@ -338,7 +649,7 @@ class MultiFormatDocumentLoader:
                             # Check if next line is empty or very different (confirms standalone title)
                             if i + 1 < len(lines) and (not lines[i+1] or len(lines[i+1]) > len(line) * 1.5):
                                 extracted_info['title'] = line
-                                logger.info(f"📝 Extracted title (standalone) from content: {extracted_info['title']}")
+                                logger.info("📝 Extracted title (standalone) from content: %s", extracted_info['title'])
                                 break
                 
                 # Strategy 3: Check colophon at end (often has full title)
@@ -350,7 +661,7 @@ class MultiFormatDocumentLoader:
                         colophon_match = re.search(r'^([A-Z][a-zA-Z\s]{10,50}?)\s+was\s+(?:laid out|printed)', last_pages, re.MULTILINE)
                         if colophon_match:
                             extracted_info['title'] = colophon_match.group(1).strip()
-                            logger.info(f"📝 Extracted title (colophon) from content: {extracted_info['title']}")
+                            logger.info("📝 Extracted title (colophon) from content: %s", extracted_info['title'])
         
         # Merge extracted info with PDF metadata
         combined_metadata = {**extracted_info, **pdf_metadata}  # PDF metadata takes precedence
@@ -375,7 +686,7 @@ class MultiFormatDocumentLoader:
                 metadata={'source': file_path, 'page': 0, 'type': 'metadata'}
             )
             pages.insert(0, metadata_doc)
-            logger.info(f"✅ Created searchable metadata chunk with {len(combined_metadata)} fields")
+            logger.info("✅ Created searchable metadata chunk with %s fields", len(combined_metadata))
         else:
             logger.warning("⚠️ No metadata or title/author found in document")
         
@@ -394,27 +705,34 @@ class MultiFormatDocumentLoader:
         metadata = {
             'format': 'PDF',
             'pages': len(pages),
-            'filename': Path(file_path).name,
+            'filename': filename,
             **combined_metadata  # Include all metadata
         }
         
         return pages, metadata
     
     @staticmethod
-    def _load_docx(file_path: str) -> Tuple[List[Document], Dict[str, Any]]:
+    def _load_docx(file_path: str, filename: str) -> Tuple[List[Document], Dict[str, Any]]:
         """Load Word document."""
-        logger.info(f"📝 Loading DOCX: {file_path}")
+        logger.info("📝 Loading DOCX: %s", file_path)
         
         try:
             loader = UnstructuredWordDocumentLoader(file_path)
             documents = loader.load()
         except Exception as e:
             # Fallback: try reading with python-docx directly
-            logger.warning(f"Trying alternative DOCX loader: {e}")
+            logger.warning("Trying alternative DOCX loader: %s", e)
             try:
                 from docx import Document as DocxDocument
                 doc = DocxDocument(file_path)
-                text = '\n'.join([para.text for para in doc.paragraphs if para.text.strip()])
+                # Stream paragraphs into one buffer instead of a list + join
+                buf = io.StringIO()
+                for para in doc.paragraphs:
+                    para_text = para.text
+                    if para_text and not para_text.isspace():
+                        buf.write(para_text)
+                        buf.write('\n')
+                text = buf.getvalue().rstrip('\n')
                 documents = [Document(page_content=text, metadata={'source': file_path})]
             except Exception as e2:
                 raise ValueError(f"Failed to load DOCX file: {e2}")
@@ -422,15 +740,15 @@ class MultiFormatDocumentLoader:
         metadata = {
             'format': 'DOCX',
             'sections': len(documents),
-            'filename': Path(file_path).name
+            'filename': filename
         }
         
         return documents, metadata
     
     @staticmethod
-    def _load_txt(file_path: str) -> Tuple[List[Document], Dict[str, Any]]:
+    def _load_txt(file_path: str, filename: str) -> Tuple[List[Document], Dict[str, Any]]:
         """Load text file."""
-        logger.info(f"📃 Loading TXT: {file_path}")
+        logger.info("📃 Loading TXT: %s", file_path)
         
         try:
             loader = TextLoader(file_path, encoding='utf-8')
@@ -441,7 +759,7 @@ class MultiFormatDocumentLoader:
                 try:
                     loader = TextLoader(file_path, encoding=encoding)
                     documents = loader.load()
-                    logger.info(f"Loaded with encoding: {encoding}")
+                    logger.info("Loaded with encoding: %s", encoding)
                     break
                 except:
                     continue
@@ -451,54 +769,36 @@ class MultiFormatDocumentLoader:
         metadata = {
             'format': 'TXT',
             'sections': len(documents),
-            'filename': Path(file_path).name
+            'filename': filename
         }
         
         return documents, metadata
     
     @staticmethod
-    def _load_pcap(file_path: str) -> Tuple[List[Document], Dict[str, Any]]:
+    def _load_pcap(file_path: str, filename: str) -> Tuple[List[Document], Dict[str, Any]]:
         """Load and analyze PCAP network capture file."""
-        logger.info(f"📡 Loading PCAP: {file_path}")
+        logger.info("📡 Loading PCAP: %s", file_path)
         
-        if not SCAPY_AVAILABLE:
-            raise ImportError("Scapy is required for PCAP files. Install: pip install scapy")
+        if not (DPKT_AVAILABLE or SCAPY_AVAILABLE):
+            raise ImportError("dpkt or Scapy is required for PCAP files. Install: pip install dpkt")
         
         try:
-            packets = rdpcap(file_path)
+            stats = MultiFormatDocumentLoader._scan_pcap_dpkt(file_path) if DPKT_AVAILABLE else None
+            if stats is None:
+                # No dpkt, or a link type it can't decode
+                if not SCAPY_AVAILABLE:
+                    raise ValueError("unsupported link type; install Scapy to analyze this capture")
+                stats = MultiFormatDocumentLoader._scan_pcap_scapy(file_path)
+            total_packets, protocols, ip_addresses, ports = stats
             
             # Analyze PCAP content
             analysis = []
-            analysis.append(f"PCAP File Analysis: {Path(file_path).name}")
-            analysis.append(f"Total Packets: {len(packets)}\n")
-            
-            # Protocol statistics
-            protocols = {}
-            ip_addresses = set()
-            ports = set()
-            
-            for i, packet in enumerate(packets[:1000]):  # Limit to first 1000 for performance
-                # Get protocol info
-                if packet.haslayer(IP):
-                    ip_layer = packet[IP]
-                    ip_addresses.add(ip_layer.src)
-                    ip_addresses.add(ip_layer.dst)
-                    
-                    proto = packet.sprintf("%IP.proto%")
-                    protocols[proto] = protocols.get(proto, 0) + 1
-                    
-                    if packet.haslayer(TCP):
-                        tcp_layer = packet[TCP]
-                        ports.add(tcp_layer.sport)
-                        ports.add(tcp_layer.dport)
-                    elif packet.haslayer(UDP):
-                        udp_layer = packet[UDP]
-                        ports.add(udp_layer.sport)
-                        ports.add(udp_layer.dport)
+            analysis.append(f"PCAP File Analysis: {filename}")
+            analysis.append(f"Total Packets: {total_packets}\n")
             
             # Build analysis text
             analysis.append("Protocol Distribution:")
-            for proto, count in sorted(protocols.items(), key=lambda x: x[1], reverse=True):
+            for proto, count in protocols.most_common():
                 analysis.append(f"  - {proto}: {count} packets")
             
             analysis.append(f"\nUnique IP Addresses: {len(ip_addresses)}")
@@ -513,16 +813,131 @@ class MultiFormatDocumentLoader:
             
             metadata = {
                 'format': 'PCAP',
-                'packets': len(packets),
+                'packets': total_packets,
                 'protocols': len(protocols),
                 'unique_ips': len(ip_addresses),
-                'filename': Path(file_path).name
+                'filename': filename
             }
             
             return documents, metadata
             
         except Exception as e:
             raise ValueError(f"Failed to load PCAP file: {e}")
+    
+    @staticmethod
+    def _scan_pcap_dpkt(file_path: str) -> Optional[Tuple[int, Counter, set, set]]:
+        """
+        Stream packets with dpkt; only the first PCAP_ANALYSIS_LIMIT are parsed.
+        
+        Returns None when the capture's link type is not one dpkt can decode here.
+        """
+        limit = MultiFormatDocumentLoader.PCAP_ANALYSIS_LIMIT
+        
+        # Fixed-size field buffers (two addresses/ports per packet)
+        addresses = np.empty(2 * limit, dtype=np.uint32)
+        ports = np.empty(2 * limit, dtype=np.uint16)
+        protocols = np.empty(limit, dtype=np.uint8)
+        num_ip = num_ports = 0
+        total_packets = 0
+        
+        with open(file_path, 'rb') as f:
+            try:
+                reader = dpkt.pcap.Reader(f)
+            except ValueError:
+                # Not a classic pcap header - try pcapng
+                f.seek(0)
+                reader = dpkt.pcapng.Reader(f)
+            decode = MultiFormatDocumentLoader._dpkt_decoder(reader.datalink())
+            if decode is None:
+                return None
+            
+            for _, buf in reader:
+                total_packets += 1
+                if total_packets > limit:
+                    continue  # Past the analysis window: count only
+                
+                ip = MultiFormatDocumentLoader._dpkt_ip_layer(buf, decode)
+                if ip is None:
+                    continue
+                
+                addresses[2 * num_ip] = int.from_bytes(ip.src, 'big')
+                addresses[2 * num_ip + 1] = int.from_bytes(ip.dst, 'big')
+                protocols[num_ip] = ip.p
+                num_ip += 1
+                
+                transport = ip.data
+                if isinstance(transport, (dpkt.tcp.TCP, dpkt.udp.UDP)):
+                    ports[num_ports] = transport.sport
+                    ports[num_ports + 1] = transport.dport
+                    num_ports += 2
+        
+        # One sort/count pass per field over contiguous integer buffers
+        unique_addresses = np.unique(addresses[:2 * num_ip])
+        unique_ports = np.unique(ports[:num_ports])
+        protocol_counts = np.bincount(protocols[:num_ip])
+        
+        ip_addresses = {socket.inet_ntoa(int(a).to_bytes(4, 'big')) for a in unique_addresses}
+        protocol_stats = Counter({
+            IP_PROTOCOL_NAMES.get(number, str(number)): int(count)
+            for number, count in enumerate(protocol_counts) if count
+        })
+        
+        return total_packets, protocol_stats, ip_addresses, {int(p) for p in unique_ports}
+    
+    @staticmethod
+    def _dpkt_decoder(datalink: int):
+        """Return a frame -> network layer decoder for a pcap link type, or None."""
+        if datalink in PCAP_ETHERNET_LINKTYPES:
+            return lambda buf: dpkt.ethernet.Ethernet(buf).data
+        if datalink in PCAP_SLL_LINKTYPES:
+            return lambda buf: dpkt.sll.SLL(buf).data
+        if datalink in PCAP_RAW_IP_LINKTYPES:
+            # Raw frames may also carry IPv6; only version-4 headers are parsed
+            return lambda buf: dpkt.ip.IP(buf) if buf and buf[0] >> 4 == 4 else None
+        if datalink in PCAP_LOOPBACK_LINKTYPES:
+            return lambda buf: dpkt.loopback.Loopback(buf).data
+        return None
+    
+    @staticmethod
+    def _dpkt_ip_layer(buf: bytes, decode):
+        """Return the IPv4 layer of a raw frame, or None."""
+        try:
+            ip = decode(buf)
+        except (dpkt.UnpackError, IndexError):
+            return None
+        return ip if isinstance(ip, dpkt.ip.IP) else None
+    
+    @staticmethod
+    def _scan_pcap_scapy(file_path: str) -> Tuple[int, Counter, set, set]:
+        """Stream packets with Scapy's PcapReader instead of loading the whole capture."""
+        limit = MultiFormatDocumentLoader.PCAP_ANALYSIS_LIMIT
+        protocols = Counter()
+        ip_addresses = set()
+        ports = set()
+        total_packets = 0
+        
+        with PcapReader(file_path) as reader:
+            for packet in reader:
+                total_packets += 1
+                if total_packets > limit:
+                    continue  # Past the analysis window: count only
+                
+                if packet.haslayer(IP):
+                    ip_layer = packet[IP]
+                    ip_addresses.add(ip_layer.src)
+                    ip_addresses.add(ip_layer.dst)
+                    protocols[packet.sprintf("%IP.proto%")] += 1
+                    
+                    if packet.haslayer(TCP):
+                        tcp_layer = packet[TCP]
+                        ports.add(tcp_layer.sport)
+                        ports.add(tcp_layer.dport)
+                    elif packet.haslayer(UDP):
+                        udp_layer = packet[UDP]
+                        ports.add(udp_layer.sport)
+                        ports.add(udp_layer.dport)
+        
+        return total_packets, protocols, ip_addresses, ports
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -532,8 +947,25 @@ class MultiFormatDocumentLoader:
 class DocumentSearchTool:
     """Custom tool for searching uploaded documents."""
     
-    def __init__(self, vectorstore: Optional[FAISS] = None):
+    SEARCH_K = 6              # Chunks returned per search
+    QUERY_CACHE_SIZE = 256    # Distinct queries remembered per document
+    SNIPPET_CHARS = 400       # Characters shown per regular chunk
+    
+    def __init__(self, vectorstore: Optional[FAISS] = None, embed_query=None):
         self.vectorstore = vectorstore
+        # Optional shared query embedder; defaults to the vectorstore's own
+        self.embed_query = embed_query
+        # Repeated queries skip both the embedding request and the index scan
+        self._cached_search = functools.lru_cache(maxsize=self.QUERY_CACHE_SIZE)(self._search_ids)
+    
+    def _search_ids(self, query: str) -> Tuple[str, ...]:
+        """Embed the query and return the docstore ids of the top-k chunks."""
+        store = self.vectorstore
+        embed_query = self.embed_query or store.embedding_function.embed_query
+        query_vector = np.asarray([embed_query(query)], dtype=np.float32)
+        faiss.normalize_L2(query_vector)  # Inner product on unit vectors = cosine similarity
+        _, indices = store.index.search(query_vector, self.SEARCH_K)
+        return tuple(store.index_to_docstore_id[i] for i in indices[0] if i != -1)
     
     def search(self, query: str) -> str:
         """Search the uploaded document for relevant information with improved coverage."""
@@ -545,66 +977,94 @@ class DocumentSearchTool:
         
         try:
             # Search for relevant documents with more results
-            docs = self.vectorstore.similarity_search(query, k=6)
+            doc_ids = self._cached_search(' '.join(query.split()))
+            docs = [self.vectorstore.docstore.search(doc_id) for doc_id in doc_ids]
             
             if not docs:
                 return "No relevant information found in the document."
             
-            # Format results with better context
-            results = []
-            for i, doc in enumerate(docs, 1):
-                page = doc.metadata.get('page', 'N/A')
-                doc_type = doc.metadata.get('type', '')
-                
-                # Show more content for metadata chunks
-                if doc_type == 'metadata':
-                    content = doc.page_content  # Full metadata
-                    results.append(f"[Document Metadata]\n{content}")
-                else:
-                    content = doc.page_content[:400]  # Show more content
-                    if len(doc.page_content) > 400:
-                        content += "..."
-                    results.append(f"[Source {i} - Page {page}]\n{content}")
+            # Format results with better context (full text for metadata chunks)
+            snippet = self.SNIPPET_CHARS
+            results = [
+                "[Document Metadata]\n%s" % doc.page_content
+                if doc.metadata.get('type') == 'metadata' else
+                "[Source %d - Page %s]\n%s%s" % (
+                    i,
+                    doc.metadata.get('page', 'N/A'),
+                    doc.page_content[:snippet],
+                    "..." if len(doc.page_content) > snippet else ""
+                )
+                for i, doc in enumerate(docs, 1)
+            ]
             
             return "\n\n".join(results)
         
         except Exception as e:
-            logger.error(f"Error in document search: {e}")
+            logger.error("Error in document search: %s", e)
             return f"Error searching document: {str(e)}"
     
     def update_vectorstore(self, vectorstore: FAISS):
         """Update the vectorstore when a new document is uploaded."""
         self.vectorstore = vectorstore
+        self._cached_search.cache_clear()
 
 
 class PythonCalculatorTool:
     """Custom tool for mathematical calculations."""
     
+    # Safe namespace with math functions
+    NAMESPACE = {
+        'abs': abs, 'round': round, 'min': min, 'max': max,
+        'sum': sum, 'pow': pow,
+        'sqrt': math.sqrt, 'sin': math.sin, 'cos': math.cos,
+        'tan': math.tan, 'log': math.log, 'exp': math.exp,
+        'pi': math.pi, 'e': math.e
+    }
+    
+    # Only arithmetic, literals, names from NAMESPACE and calls to them
+    ALLOWED_NODES = (
+        ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load,
+        ast.Constant, ast.Tuple, ast.List, ast.operator, ast.unaryop
+    )
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _compile(expression: str):
+        """Validate an expression against the whitelist and compile it once."""
+        tree = ast.parse(expression, mode='eval')
+        
+        for node in ast.walk(tree):
+            if not isinstance(node, PythonCalculatorTool.ALLOWED_NODES):
+                raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+            if isinstance(node, ast.Name) and node.id not in PythonCalculatorTool.NAMESPACE:
+                raise ValueError(f"Unknown name: {node.id}")
+            if isinstance(node, ast.Call) and not isinstance(node.func, ast.Name):
+                raise ValueError("Only direct function calls are allowed")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, complex)):
+                raise ValueError(f"Unsupported literal: {node.value!r}")
+        
+        return compile(tree, "<calculator>", "eval")
+    
     def calculate(self, expression: str) -> str:
         """Safely evaluate mathematical expressions."""
         try:
-            import math
-            
-            # Safe namespace with math functions
-            safe_dict = {
-                'abs': abs, 'round': round, 'min': min, 'max': max,
-                'sum': sum, 'pow': pow,
-                'sqrt': math.sqrt, 'sin': math.sin, 'cos': math.cos,
-                'tan': math.tan, 'log': math.log, 'exp': math.exp,
-                'pi': math.pi, 'e': math.e
-            }
-            
             # Clean expression
             expression = expression.strip()
             
             # Evaluate expression
-            result = eval(expression, {"__builtins__": {}}, safe_dict)
+            result = eval(self._compile(expression), {"__builtins__": {}}, self.NAMESPACE)
             return f"Result: {result}"
         
         except Exception as e:
             return f"Error calculating '{expression}': {str(e)}"
 
 
+# Whole whitespace-delimited tokens that are 5+ alphanumeric characters, i.e. the
+# tokens of text.split() with len > 4 and isalnum(); "traffic," or "network_traffic"
+# are not keywords
+KEYWORD_PATTERN = re.compile(r"(?<!\S)[^\W_]{5,}(?!\S)")
+
+
 class TextAnalysisTool:
     """Custom tool for text analysis tasks."""
     
@@ -615,14 +1075,14 @@ class TextAnalysisTool:
                 return "Text too short to analyze. Please provide more text."
             
             # Word and character count
-            words = text.split()
-            word_count = len(words)
+            word_count = len(text.split())
             char_count = len(text)
             
-            # Extract keywords (frequency-based)
-            meaningful_words = [w.lower() for w in words if len(w) > 4 and w.isalnum()]
-            if meaningful_words:
-                common = Counter(meaningful_words).most_common(5)
+            # Extract keywords (frequency-based), counted straight off the regex scan
+            keyword_counts = Counter()
+            keyword_counts.update(match.group().lower() for match in KEYWORD_PATTERN.finditer(text))
+            if keyword_counts:
+                common = keyword_counts.most_common(5)
                 keywords = [word for word, count in common]
                 keywords_str = ', '.join(keywords)
             else:
@@ -704,7 +1164,7 @@ class GroundedTavilySearchTool:
             return "\n\n".join(formatted_results) + citation_note
         
         except Exception as e:
-            logger.error(f"Error in Tavily search: {e}")
+            logger.error("Error in Tavily search: %s", e)
             return f"Error performing web search: {str(e)}"
     
     def get_last_sources(self) -> List[Dict[str, Any]]:
@@ -712,6 +1172,10 @@ class GroundedTavilySearchTool:
         return self.last_search_sources.copy()
 
 
+# DataFormatter list separators, in order of preference
+FORMAT_SEPARATORS = (',', '\n', ';')
+
+
 class DataFormatterTool:
     """Custom tool for data formatting and conversion."""
     
@@ -727,13 +1191,10 @@ class DataFormatterTool:
             if '•' in data or '- ' in data or data.strip().startswith(('1.', '2.', '3.')):
                 return f"Already formatted:\n{data}"
             
-            # Try different separators
-            if ',' in data:
-                items = [item.strip() for item in data.split(',') if item.strip()]
-            elif '\n' in data:
-                items = [item.strip() for item in data.split('\n') if item.strip()]
-            elif ';' in data:
-                items = [item.strip() for item in data.split(';') if item.strip()]
+            # Try different separators (substring checks run in C; stop at the first hit)
+            separator = next((sep for sep in FORMAT_SEPARATORS if sep in data), None)
+            if separator:
+                items = [item.strip() for item in data.split(separator) if item.strip()]
             else:
                 if len(data.split()) > 10:
                     return f"FORMATTED TEXT:\n━━━━━━━━━━━━━━━━━━━━━━\n{data}\n━━━━━━━━━━━━━━━━━━━━━━"
@@ -753,6 +1214,58 @@ class DataFormatterTool:
             return f"Error formatting data: {str(e)}\nOriginal data: {data}"
 
 
+# ═══════════════════════════════════════════════════════════════════
+# 🧰 Tool Registry
+# ═══════════════════════════════════════════════════════════════════
+
+# (tool name, AgenticRAG attribute path of the tool function, description)
+CORE_TOOL_SPECS = (
+    (
+        "DocumentSearch",
+        "doc_search_tool.search",
+        """Search uploaded documents (PDF, DOCX, TXT, PCAP) including metadata (author, title, etc.). Use for ANY question about the document content.
+Input: search keywords or phrases (e.g., 'author', 'title', 'main topic', specific terms).
+Returns: Relevant excerpts including document metadata.
+Example: 'Who is the author?' → input: 'author'
+Example: 'What is this about?' → input: 'main topic summary'"""
+    ),
+    (
+        "Calculator",
+        "calculator_tool.calculate",
+        """Perform mathematical calculations.
+Input: Math expression (e.g., '25*4', '100/12', 'sqrt(16)').
+Example: 'Calculate 25 times 4' → input: '25*4'."""
+    ),
+    (
+        "TextAnalysis",
+        "text_analysis_tool.analyze",
+        """Analyze text to get word count, keywords, and summary.
+Input: The text to analyze.
+Example: 'Analyze this: [text]' → input: '[text]'."""
+    ),
+    (
+        "DataFormatter",
+        "data_formatter_tool.format",
+        """Format items as bullet points.
+Input: Comma-separated items.
+Example: 'Format: A, B, C' → input: 'A, B, C'."""
+    ),
+)
+
+WEB_SEARCH_DESCRIPTION = """Search the internet for current information. Use ONLY when user asks for 'latest', 'today', 'now', '2024', '2025', 'current', or 'recent' info.
+
+CRITICAL: When you use this tool, you MUST cite sources in your final answer using [Source X] format and include URLs. 
+Your response must be grounded in the search results provided. Do not make claims not supported by the search results.
+
+Input: Search query.
+Example: 'Latest Azure pricing' → input: 'Azure pricing 2024'.
+Returns: Search results with source URLs - you MUST cite these in your answer."""
+
+WIKIPEDIA_DESCRIPTION = """Search Wikipedia for factual information.
+Input: Search topic.
+Example: 'Who is Albert Einstein?' → input: 'Albert Einstein'."""
+
+
 # ═══════════════════════════════════════════════════════════════════
 # 🤖 Agentic RAG System - MODERN IMPLEMENTATION
 # ═══════════════════════════════════════════════════════════════════
@@ -768,6 +1281,72 @@ class AgenticRAG:
     - JSON-based persistence
     """
     
+    # Chunking configuration
+    CHUNK_SIZE = 1500        # Larger chunks: fewer embeddings and a smaller index
+    CHUNK_OVERLAP = 150      # Enough overlap to keep sentences intact at boundaries
+    
+    # Vector index configuration
+    INDEX_CACHE_DIR = "faiss_index"
+    IVF_MIN_CHUNKS = 2000    # Below this, exact (flat) search is cheap enough
+    IVF_NPROBE = 8           # Inverted lists scanned per query
+    IVF_ENCODING = "SQ8"     # Vector codes: "SQ8" (8-bit scalar, 4x smaller) or "PQ32x8"
+    EMBED_BATCH_SIZE = 512   # Chunks per embeddings request
+    EMBED_CONCURRENCY = 8    # Embedding requests in flight at once
+    QUERY_EMBED_CACHE_SIZE = 512  # Query embeddings memoized across chat() and tools
+    
+    # Only answers built purely from these tools are reused for similar queries:
+    # Calculator/TextAnalysis/DataFormatter results depend on the exact input text,
+    # and "what is 17*23" vs "17*24" embed almost identically
+    SEMANTIC_CACHE_TOOLS = frozenset({"DocumentSearch", "Wikipedia"})
+    
+    # Inputs answered directly, without an LLM call
+    GREETINGS = frozenset({
+        "hi", "hello", "hey", "hiya", "yo", "good morning", "good afternoon",
+        "good evening", "hola", "bonjour",
+    })
+    THANKS = frozenset({"thanks", "thank you", "thx", "ty", "thanks a lot", "thank you so much"})
+    # Explicit prompt-injection phrasing only; questions *about* credentials, keys
+    # or secrets in a document must still reach the agent
+    POLICY_PATTERN = re.compile(
+        r"\b(?:ignore|disregard|forget) (?:all |any )?(?:of )?(?:your |the )?(?:previous|prior|above|earlier) (?:instructions|prompts)"
+        r"|\b(?:reveal|print|show|repeat|output) (?:me )?your (?:system prompt|hidden instructions|initial instructions)",
+        re.IGNORECASE
+    )
+    DIRECT_RESPONSES = {
+        "empty": {
+            "response": "Please provide a valid question.",
+            "metadata": {"error": "Empty query", "direct_response": "empty"},
+            "sources": []
+        },
+        "thanks": {
+            "response": "😊 You're welcome! Let me know if there's anything else I can help with.",
+            "metadata": {"tools_used": [], "num_steps": 0, "agent_reasoning": None,
+                         "direct_response": "thanks"},
+            "sources": []
+        },
+        "greeting": {
+            "response": (
+                "👋 Hello! Upload a document and ask me about it, or ask a general "
+                "question - I can search, calculate, analyze text and format data."
+            ),
+            "metadata": {"tools_used": [], "num_steps": 0, "agent_reasoning": None,
+                         "direct_response": "greeting"},
+            "sources": []
+        },
+        "policy": {
+            "response": "🚫 I can't help with that request.",
+            "metadata": {"tools_used": [], "num_steps": 0, "agent_reasoning": None,
+                         "direct_response": "policy"},
+            "sources": []
+        },
+    }
+    
+    # Wikipedia client, shared by every instance (holds an HTTP session)
+    _wikipedia_api: Optional[WikipediaQueryRun] = None
+    
+    # GPU memory/stream pool for FAISS, shared by every instance
+    _gpu_resources = None
+    
     def __init__(self, api_keys: Dict[str, str], memory_path: str = "memory_store"):
         """Initialize the Agentic RAG System."""
         logger.info("🚀 Initializing Agentic RAG System...")
@@ -786,19 +1365,36 @@ class AgenticRAG:
                 default_headers={"User-Agent": "LangChain-OpenAI-Client"}
             )
             self.embeddings = OpenAIEmbeddings(
+                chunk_size=self.EMBED_BATCH_SIZE,
                 default_headers={"User-Agent": "LangChain-OpenAI-Client"}
             )
         except Exception as e:
             raise ValueError(f"Failed to initialize OpenAI components. Check your API key: {e}")
         
+        # One memoized query encoder shared by the semantic cache and DocumentSearch
+        self.embed_query = functools.lru_cache(maxsize=self.QUERY_EMBED_CACHE_SIZE)(
+            self.embeddings.embed_query
+        )
+        
         self.vectorstore: Optional[FAISS] = None
         self.document_metadata: Dict[str, Any] = {}
         
+        # Text splitter, shared by every document (character-based length, no tokenizer)
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.CHUNK_SIZE,
+            chunk_overlap=self.CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ".", " ", ""],  # Split at paragraphs, sentences, then words
+            length_function=len
+        )
+        
         # Memory manager
         self.memory_manager = MemoryManager(memory_path)
         
+        # Near-duplicate queries are answered without running the agent
+        self.semantic_cache = SemanticCache()
+        
         # Custom tool instances
-        self.doc_search_tool = DocumentSearchTool()
+        self.doc_search_tool = DocumentSearchTool(embed_query=self.embed_query)
         self.calculator_tool = PythonCalculatorTool()
         self.text_analysis_tool = TextAnalysisTool()
         self.data_formatter_tool = DataFormatterTool()
@@ -810,7 +1406,7 @@ class AgenticRAG:
                 self.grounded_tavily_tool = GroundedTavilySearchTool(max_results=3)
                 logger.info("✅ Grounded Tavily search tool initialized")
             except Exception as e:
-                logger.warning(f"⚠️ Failed to initialize grounded Tavily tool: {e}")
+                logger.warning("⚠️ Failed to initialize grounded Tavily tool: %s", e)
         
         # Conversation memory for agent
         self.agent_memory = ConversationBufferMemory(
@@ -818,6 +1414,17 @@ class AgenticRAG:
             return_messages=True
         )
         
+        # Background worker for per-turn bookkeeping (one thread keeps turns in order)
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mem-io")
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
+        
+        # Queries answered by _maybe_direct_response
+        self.direct_hits = 0
+        
+        # Failed chat() results, counted by _error_result
+        self.error_count = 0
+        
         # Agent (initialized with tools)
         self.agent_executor = None
         
@@ -838,16 +1445,17 @@ class AgenticRAG:
     
     def _load_recent_conversations_to_memory(self):
         """Load recent conversations from MemoryManager into agent memory."""
-        recent = self.memory_manager.interaction_history[-10:]
+        recent = self.memory_manager.get_recent(10)
         
+        # Bulk insert instead of one save_context() round per interaction
+        messages = []
         for interaction in recent:
-            self.agent_memory.save_context(
-                {"input": interaction.query},
-                {"output": interaction.response}
-            )
+            messages.append(HumanMessage(content=interaction.query))
+            messages.append(AIMessage(content=interaction.response))
+        self.agent_memory.chat_memory.add_messages(messages)
         
         if recent:
-            logger.info(f"📚 Loaded {len(recent)} past conversations into agent memory")
+            logger.info("📚 Loaded %s past conversations into agent memory", len(recent))
     
     def _initialize_agent(self):
         """Initialize agent using initialize_agent method (compatible with LangChain 0.1.0+)."""
@@ -868,60 +1476,25 @@ class AgenticRAG:
                 return_intermediate_steps=True
             )
             
-            logger.info(f"✅ Agent initialized with {len(tools)} tools (ZERO_SHOT_REACT agent)")
+            logger.info("✅ Agent initialized with %s tools (ZERO_SHOT_REACT agent)", len(tools))
         except Exception as e:
-            logger.error(f"❌ Failed to initialize agent: {e}")
+            logger.error("❌ Failed to initialize agent: %s", e)
             raise
     
+    @classmethod
+    def _get_wikipedia_api(cls) -> WikipediaQueryRun:
+        """Create the shared Wikipedia client on first use."""
+        if cls._wikipedia_api is None:
+            cls._wikipedia_api = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
+        return cls._wikipedia_api
+    
     def _create_tools(self) -> List[Tool]:
         """Create all available tools for the agent."""
-        tools = []
-        
-        # 1. Document Search Tool
-        tools.append(
-            Tool(
-                name="DocumentSearch",
-                func=self.doc_search_tool.search,
-                description="""Search uploaded documents (PDF, DOCX, TXT, PCAP) including metadata (author, title, etc.). Use for ANY question about the document content.
-Input: search keywords or phrases (e.g., 'author', 'title', 'main topic', specific terms).
-Returns: Relevant excerpts including document metadata.
-Example: 'Who is the author?' → input: 'author'
-Example: 'What is this about?' → input: 'main topic summary'"""
-            )
-        )
-        
-        # 2. Calculator Tool
-        tools.append(
-            Tool(
-                name="Calculator",
-                func=self.calculator_tool.calculate,
-                description="""Perform mathematical calculations.
-Input: Math expression (e.g., '25*4', '100/12', 'sqrt(16)').
-Example: 'Calculate 25 times 4' → input: '25*4'."""
-            )
-        )
-        
-        # 3. Text Analysis Tool
-        tools.append(
-            Tool(
-                name="TextAnalysis",
-                func=self.text_analysis_tool.analyze,
-                description="""Analyze text to get word count, keywords, and summary.
-Input: The text to analyze.
-Example: 'Analyze this: [text]' → input: '[text]'."""
-            )
-        )
-        
-        # 4. Data Formatter Tool
-        tools.append(
-            Tool(
-                name="DataFormatter",
-                func=self.data_formatter_tool.format,
-                description="""Format items as bullet points.
-Input: Comma-separated items.
-Example: 'Format: A, B, C' → input: 'A, B, C'."""
-            )
-        )
+        # 1-4. Document Search, Calculator, Text Analysis, Data Formatter
+        tools = [
+            Tool(name=name, func=attrgetter(func_path)(self), description=description)
+            for name, func_path, description in CORE_TOOL_SPECS
+        ]
         
         # 5. Web Search Tool (Tavily) - with explicit grounding
         if self.grounded_tavily_tool:
@@ -929,80 +1502,75 @@ Example: 'Format: A, B, C' → input: 'A, B, C'."""
                 tavily_tool = Tool(
                     name="WebSearch",
                     func=self.grounded_tavily_tool.search,
-                    description="""Search the internet for current information. Use ONLY when user asks for 'latest', 'today', 'now', '2024', '2025', 'current', or 'recent' info.
-
-CRITICAL: When you use this tool, you MUST cite sources in your final answer using [Source X] format and include URLs. 
-Your response must be grounded in the search results provided. Do not make claims not supported by the search results.
-
-Input: Search query.
-Example: 'Latest Azure pricing' → input: 'Azure pricing 2024'.
-Returns: Search results with source URLs - you MUST cite these in your answer."""
+                    description=WEB_SEARCH_DESCRIPTION
                 )
                 tools.append(tavily_tool)
                 logger.info("✅ Grounded Tavily WebSearch tool added")
             except Exception as e:
-                logger.warning(f"⚠️ Grounded Tavily tool failed: {e}")
+                logger.warning("⚠️ Grounded Tavily tool failed: %s", e)
         
         # 6. Wikipedia Tool - wrapped in Tool for compatibility
         try:
-            wiki_api = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
             wiki_tool = Tool(
                 name="Wikipedia",
-                func=wiki_api.run,
-                description="""Search Wikipedia for factual information.
-Input: Search topic.
-Example: 'Who is Albert Einstein?' → input: 'Albert Einstein'."""
+                func=self._get_wikipedia_api().run,
+                description=WIKIPEDIA_DESCRIPTION
             )
             tools.append(wiki_tool)
         except Exception as e:
-            logger.warning(f"⚠️ Wikipedia tool failed: {e}")
+            logger.warning("⚠️ Wikipedia tool failed: %s", e)
         
-        logger.info(f"📦 Created {len(tools)} tools")
+        logger.info("📦 Created %s tools", len(tools))
         return tools
     
     def process_document(self, file_path: str) -> Dict[str, Any]:
         """Process document of any supported format."""
         try:
-            logger.info(f"📄 Processing document: {file_path}")
+            logger.info("📄 Processing document: %s", file_path)
             
-            # Load document
-            documents, doc_metadata = MultiFormatDocumentLoader.load_document(file_path)
-            
-            if not documents:
-                return {
-                    'success': False,
-                    'error': 'No content extracted from document'
-                }
+            # Reuse the persisted index if this exact file was processed before
+            cache_dir = Path(self.INDEX_CACHE_DIR) / self._index_cache_key(file_path)
+            cached = self._load_vectorstore(cache_dir)
             
-            # Split into chunks with better overlap for comprehensive coverage
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1200,  # Slightly larger chunks for better context
-                chunk_overlap=300,  # More overlap to avoid losing info at boundaries
-                separators=["\n\n", "\n", ".", " ", ""]  # Split at paragraphs, sentences, then words
-            )
-            chunks = text_splitter.split_documents(documents)
-            
-            # Create vector store with proper embeddings
-            texts = [doc.page_content for doc in chunks]
-            metadatas = [doc.metadata for doc in chunks]
-            self.vectorstore = FAISS.from_texts(texts, self.embeddings, metadatas=metadatas)
+            if cached:
+                self.vectorstore, doc_metadata = cached
+                doc_metadata['filename'] = os.path.basename(file_path)
+                num_chunks = self.vectorstore.index.ntotal
+                logger.info("♻️ Reusing cached index: %s", cache_dir)
+            else:
+                # Load document
+                documents, doc_metadata = MultiFormatDocumentLoader.load_document(file_path)
+                
+                if not documents:
+                    return {
+                        'success': False,
+                        'error': 'No content extracted from document'
+                    }
+                
+                # Split into chunks
+                chunks = self.text_splitter.split_documents(documents)
+                num_chunks = len(chunks)
+                
+                # Create vector store with proper embeddings
+                texts = [doc.page_content for doc in chunks]
+                metadatas = [doc.metadata for doc in chunks]
+                self.vectorstore = self._build_vectorstore(texts, metadatas)
+                
+                # Save to disk
+                self._save_vectorstore(cache_dir, doc_metadata)
             
-            # Update document search tool
+            # Update document search tool; cached answers refer to the old document
             self.doc_search_tool.update_vectorstore(self.vectorstore)
-            
-            # Save to disk
-            vectorstore_path = Path("faiss_index")
-            vectorstore_path.mkdir(exist_ok=True)
-            self.vectorstore.save_local(str(vectorstore_path))
+            self.semantic_cache.clear()
             
             # Store metadata
             self.document_metadata = {
                 **doc_metadata,
-                'chunks': len(chunks),
+                'chunks': num_chunks,
                 'timestamp': datetime.now().isoformat()
             }
             
-            logger.info(f"✅ Document processed: {doc_metadata.get('format')} - {len(chunks)} chunks")
+            logger.info("✅ Document processed: %s - %s chunks", doc_metadata.get('format'), num_chunks)
             
             return {
                 'success': True,
@@ -1010,14 +1578,164 @@ Example: 'Who is Albert Einstein?' → input: 'Albert Einstein'."""
             }
             
         except Exception as e:
-            logger.error(f"❌ Document processing failed: {e}")
-            import traceback
+            logger.error("❌ Document processing failed: %s", e)
             traceback.print_exc()
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def _index_cache_key(self, file_path: str) -> str:
+        """Hash file contents together with every setting that affects the index."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        settings = (
+            f"{self.CHUNK_SIZE}:{self.CHUNK_OVERLAP}:{self.embeddings.model}:"
+            f"{self.IVF_ENCODING}:normalized"
+        )
+        digest.update(settings.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _save_vectorstore(self, cache_dir: Path, doc_metadata: Dict[str, Any]):
+        """Persist the FAISS index and its chunks (as JSON) under cache_dir."""
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            store = self.vectorstore
+            ids = [store.index_to_docstore_id[i] for i in range(len(store.index_to_docstore_id))]
+            documents = [store.docstore.search(doc_id) for doc_id in ids]
+            
+            with open(cache_dir / "docstore.json", 'w', encoding='utf-8') as f:
+                json.dump({
+                    'doc_metadata': doc_metadata,
+                    'ids': ids,
+                    'documents': [
+                        {'page_content': doc.page_content, 'metadata': doc.metadata}
+                        for doc in documents
+                    ]
+                }, f, separators=(',', ':'))
+            
+            # Written last: its presence marks a complete cache entry
+            index = store.index
+            if self._is_gpu_index(index):
+                index = faiss.index_gpu_to_cpu(index)
+            faiss.write_index(index, str(cache_dir / "index.faiss"))
+            logger.info("💾 Index saved to %s", cache_dir)
+        except Exception as e:
+            logger.warning("⚠️ Could not save index: %s", e)
+    
+    def _load_vectorstore(self, cache_dir: Path) -> Optional[Tuple[FAISS, Dict[str, Any]]]:
+        """Load a persisted index (memory-mapped, read-only) if one exists."""
+        index_file = cache_dir / "index.faiss"
+        docstore_file = cache_dir / "docstore.json"
+        if not (index_file.exists() and docstore_file.exists()):
+            return None
+        
+        try:
+            index = faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            if isinstance(index, faiss.IndexIVF):
+                index.nprobe = self.IVF_NPROBE
+            index = self._to_gpu(index)
+            
+            with open(docstore_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            ids = data['ids']
+            docstore = InMemoryDocstore({
+                doc_id: Document(page_content=doc['page_content'], metadata=doc['metadata'])
+                for doc_id, doc in zip(ids, data['documents'])
+            })
+            vectorstore = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=dict(enumerate(ids)),
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+            return vectorstore, data['doc_metadata']
+        except Exception as e:
+            logger.warning("⚠️ Could not load cached index, rebuilding: %s", e)
+            return None
+    
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed all chunks in large batches and return an (N, dim) float32 matrix.
+        
+        Batches are sent concurrently (at most EMBED_CONCURRENCY at a time) so
+        large documents are bound by parallel rather than serial round-trips.
+        """
+        batch_size = self.EMBED_BATCH_SIZE
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        
+        if len(batches) == 1:
+            embeddings = self.embeddings.embed_documents(texts, chunk_size=batch_size)
+        else:
+            workers = min(self.EMBED_CONCURRENCY, len(batches))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+                results = pool.map(
+                    lambda batch: self.embeddings.embed_documents(batch, chunk_size=batch_size),
+                    batches
+                )
+                embeddings = list(itertools.chain.from_iterable(results))
+        
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    @classmethod
+    def _to_gpu(cls, index):
+        """Move a FAISS index onto the first GPU if one is available."""
+        if not FAISS_GPU_AVAILABLE:
+            return index
+        if cls._gpu_resources is None:
+            cls._gpu_resources = faiss.StandardGpuResources()
+        return faiss.index_cpu_to_gpu(cls._gpu_resources, 0, index)
+    
+    @staticmethod
+    def _is_gpu_index(index) -> bool:
+        """Check whether an index lives on the GPU."""
+        return FAISS_GPU_AVAILABLE and isinstance(index, faiss.GpuIndex)
+    
+    def _build_vectorstore(self, texts: List[str], metadatas: List[Dict]) -> FAISS:
+        """
+        Embed chunks and build the FAISS vector store.
+        
+        Small documents use an exact inner-product index. Large documents use
+        an IVF index with quantized codes (8-bit scalar by default) so each query
+        only scans a few inverted lists at a quarter of the FP32 memory traffic.
+        """
+        xb = self._embed_texts(texts)
+        faiss.normalize_L2(xb)  # Unit vectors: inner-product search ranks by cosine
+        num_vectors, dim = xb.shape
+        
+        if num_vectors < self.IVF_MIN_CHUNKS:
+            index = self._to_gpu(faiss.IndexFlatIP(dim))
+        else:
+            nlist = int(4 * math.sqrt(num_vectors))
+            index_spec = f"IVF{nlist},{self.IVF_ENCODING}"
+            # Train on the GPU when there is one
+            index = self._to_gpu(faiss.index_factory(dim, index_spec, faiss.METRIC_INNER_PRODUCT))
+            index.train(xb)
+            if self._is_gpu_index(index):
+                faiss.GpuParameterSpace().set_index_parameter(index, "nprobe", self.IVF_NPROBE)
+            else:
+                faiss.extract_index_ivf(index).nprobe = self.IVF_NPROBE
+            logger.info("🗂️ Built %s index for %s chunks", index_spec, num_vectors)
+        index.add(xb)
+        
+        ids = [str(uuid.uuid4()) for _ in texts]
+        docstore = InMemoryDocstore({
+            doc_id: Document(page_content=text, metadata=meta)
+            for doc_id, text, meta in zip(ids, texts, metadatas)
+        })
+        
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=dict(enumerate(ids)),
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+    
     def _extract_web_search_sources(self, intermediate_steps: List) -> List[Dict[str, Any]]:
         """Extract source URLs from WebSearch tool usage."""
         sources = []
@@ -1117,24 +1835,45 @@ Example: 'Who is Albert Einstein?' → input: 'Albert Einstein'."""
         
         return response
     
-    def chat(self, query: str) -> Dict[str, Any]:
-        """Main chat interface with explicit grounding support."""
+    def chat(self, query: str, return_reasoning: bool = False) -> Dict[str, Any]:
+        """
+        Main chat interface with explicit grounding support.
+        
+        The per-step agent trace is only included in metadata['agent_reasoning']
+        when return_reasoning is True; otherwise it is None and only the step
+        count and tools used are reported. The same applies to what is kept in
+        the history, its file, exported logs and the semantic cache.
+        """
         if not self.agent_executor:
-            return {
-                "response": "❌ Agent not initialized properly.",
-                "metadata": {"error": "Agent initialization failed"},
-                "sources": []
-            }
+            return self._error_result("❌ Agent not initialized properly.", "Agent initialization failed")
         
-        if not query or len(query.strip()) < 2:
-            return {
-                "response": "Please provide a valid question.",
-                "metadata": {"error": "Empty query"},
-                "sources": []
-            }
+        direct = self._maybe_direct_response(query)
+        if direct is not None:
+            return direct
         
         try:
-            logger.info(f"💬 Processing query: {query[:100]}...")
+            logger.info("💬 Processing query: %s...", query[:100])
+            
+            # Answer near-duplicates of recent queries from the semantic cache
+            query_embedding = self.embed_query(query)
+            cached = self.semantic_cache.lookup(query_embedding, require_trace=return_reasoning)
+            if cached is not None:
+                logger.info("⚡ Semantic cache hit (hit rate: %.0f%%)", self.semantic_cache.cache_hit_rate * 100)
+                metadata = {**cached["metadata"], "cache_hit": True}
+                if not return_reasoning:
+                    metadata["agent_reasoning"] = None
+                
+                # A hit is still a turn of its own: new id for feedback, visible in history/stats/exports
+                conversation_id = self.memory_manager.add_interaction(
+                    query=query,
+                    response=cached["response"],
+                    agent_steps=metadata["agent_reasoning"] or [],
+                    tools_used=metadata["tools_used"],
+                    num_steps=metadata["num_steps"]
+                )
+                self._submit_io(self.agent_memory.save_context, {"input": query}, {"output": cached["response"]})
+                return {**cached, "metadata": metadata,
+                        "conversation_id": conversation_id}
             
             # Invoke agent
             result = self.agent_executor.invoke({"input": query})
@@ -1171,46 +1910,83 @@ Example: 'Who is Albert Einstein?' → input: 'Albert Einstein'."""
             # Enhance response with sources if WebSearch was used
             if 'WebSearch' in tools_used and sources:
                 response = self._enhance_response_with_sources(response, sources, grounding_info)
-                logger.info(f"✅ Added {len(sources)} source citations to response")
+                logger.info("✅ Added %d source citations to response", len(sources))
             
-            # Save to memory
-            self.memory_manager.add_interaction(
+            # Save to memory (only a step count unless the trace was asked for)
+            conversation_id = self.memory_manager.add_interaction(
                 query=query,
                 response=response,
-                agent_steps=agent_steps,
-                tools_used=tools_used
+                agent_steps=agent_steps if return_reasoning else [],
+                tools_used=tools_used,
+                num_steps=len(agent_steps)
             )
             
-            # Also save to agent memory
-            self.agent_memory.save_context(
-                {"input": query},
-                {"output": response}
-            )
+            # Also save to agent memory (off the request path)
+            self._submit_io(self.agent_memory.save_context, {"input": query}, {"output": response})
             
             result_dict = {
                 "response": response,
                 "metadata": {
                     "tools_used": tools_used,
                     "num_steps": len(agent_steps),
-                    "agent_reasoning": agent_steps,
+                    "agent_reasoning": agent_steps if return_reasoning else None,
                     "grounding_info": grounding_info
                 },
                 "sources": sources,
-                "conversation_id": len(self.memory_manager.interaction_history) - 1
+                "conversation_id": conversation_id
             }
             
-            logger.info(f"✅ Query completed. Tools used: {tools_used}. Sources: {len(sources)}")
+            # Reuse retrieval answers only (web results are also time-sensitive)
+            if tools_used and self.SEMANTIC_CACHE_TOOLS.issuperset(tools_used):
+                self.semantic_cache.add(query_embedding, query, result_dict)
+            
+            logger.info("✅ Query completed. Tools used: %s. Sources: %d", tools_used, len(sources))
             return result_dict
             
         except Exception as e:
-            logger.error(f"❌ Error in chat: {e}")
-            import traceback
-            traceback.print_exc()
-            return {
-                "response": f"❌ An error occurred: {str(e)}",
-                "metadata": {"error": str(e)},
-                "sources": []
-            }
+            logger.exception("❌ Error in chat: %s", e)
+            return self._error_result(f"❌ An error occurred: {e}", str(e))
+    
+    def _error_result(self, response: str, error: str) -> Dict[str, Any]:
+        """Build a failed chat() result; the single place chat errors are counted."""
+        self.error_count += 1
+        return {"response": response, "metadata": {"error": error}, "sources": []}
+    
+    def _maybe_direct_response(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return a canned result for empty input, greetings, thanks and injection attempts."""
+        text = query.strip() if query else ""
+        if len(text) < 2:
+            kind = "empty"
+        elif text.lower().rstrip("!.?") in self.GREETINGS:
+            kind = "greeting"
+        elif text.lower().rstrip("!.?") in self.THANKS:
+            kind = "thanks"
+        elif self.POLICY_PATTERN.search(text):
+            kind = "policy"
+        else:
+            return None
+        
+        self.direct_hits += 1
+        logger.info("↩️ Direct %s response (total: %d)", kind, self.direct_hits)
+        result = self.DIRECT_RESPONSES[kind]
+        return {**result, "metadata": dict(result["metadata"])}
+    
+    def _submit_io(self, fn, *args):
+        """Run fn(*args) on the background worker and drop finished futures."""
+        with self._pending_lock:
+            while self._pending and self._pending[0].done():
+                error = self._pending.popleft().exception()
+                if error:
+                    logger.warning("⚠️ Background memory update failed: %s", error)
+            self._pending.append(self._io_pool.submit(fn, *args))
+    
+    def flush(self):
+        """Wait for all background memory updates and history writes."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+        for future in pending:
+            future.result()
+        self.memory_manager.flush()
     
     def add_feedback(self, conversation_id: int, feedback: str):
         """Add user feedback."""
@@ -1218,24 +1994,33 @@ Example: 'Who is Albert Einstein?' → input: 'Albert Einstein'."""
     
     def get_conversation_history(self, num_interactions: int = 10) -> List[InteractionLog]:
         """Get recent conversation history."""
-        return self.memory_manager.interaction_history[-num_interactions:]
+        return self.memory_manager.get_recent(num_interactions)
     
-    def clear_memory(self):
-        """Clear conversation memory."""
+    def clear_memory(self, aggressive: bool = False):
+        """Clear conversation memory; aggressive=True also runs a garbage collection."""
         self.memory_manager.clear_memory()
-        self.agent_memory.clear()
+        # Queued behind any pending save_context so no old turn reappears afterwards
+        self._submit_io(self.agent_memory.clear)
+        self.semantic_cache.clear()
+        if aggressive:
+            gc.collect()
         logger.info("🗑️ Memory cleared")
     
     def export_logs(self, filepath: str = "interaction_logs.json") -> bool:
-        """Export interaction logs to JSON."""
+        """Export interaction logs to JSON (an array with one record per line)."""
         try:
-            logs = [log.to_dict() for log in self.memory_manager.interaction_history]
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(logs, f, indent=2, ensure_ascii=False)
-            logger.info(f"📤 Logs exported to {filepath}")
+            # Snapshot the references so concurrent chats can't mutate the deque mid-export
+            logs = self.memory_manager.snapshot()
+            with open(filepath, 'wb') as f:
+                f.write(b'[')
+                for i, log in enumerate(logs):
+                    f.write(b',\n' if i else b'\n')
+                    f.write(_dump_json(log.to_dict()))
+                f.write(b'\n]\n')
+            logger.info("📤 Logs exported to %s", filepath)
             return True
         except Exception as e:
-            logger.error(f"❌ Failed to export logs: {e}")
+            logger.error("❌ Failed to export logs: %s", e)
             return False
 
 
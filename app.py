@@ -13,31 +13,67 @@ Deployed on: Hugging Face Spaces
 
 import os
 import sys
+import queue
+import atexit
 
 # Set up logging before other imports
 import logging
+from logging.handlers import QueueHandler, QueueListener
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+
+# Keep stderr writes off the request path: the real handlers run on a listener thread
+_root_logger = logging.getLogger()
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, *_root_logger.handlers, respect_handler_level=True)
+_root_logger.handlers = [QueueHandler(_log_queue)]
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 logger = logging.getLogger(__name__)
 
 logger.info("🚀 Starting Enhanced Agentic RAG System on Hugging Face Spaces...")
 
+# Skip Gradio's usage-analytics network call on import
+os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+
 # Import the UI
 try:
     from gradio_ui import create_ui
     logger.info("✅ Successfully imported UI components")
 except ImportError as e:
-    logger.error(f"❌ Failed to import UI: {e}")
+    logger.error("❌ Failed to import UI: %s", e)
     raise
 
+# Request queue: bounded backlog, one run per event at a time (Gradio's default).
+# AgenticRAG.chat() shares agent, tool and source state across calls, so it must
+# not run in parallel.
+QUEUE_MAX_SIZE = 64
+QUEUE_CONCURRENCY = 1
+
+_demo = None
+
+
+def get_demo():
+    """Build the Gradio interface once and reuse it (e.g. across reloads)."""
+    global _demo
+    if _demo is None:
+        _demo = create_ui()
+        _demo.queue(max_size=QUEUE_MAX_SIZE, default_concurrency_limit=QUEUE_CONCURRENCY)
+    return _demo
+
+
 # Create the Gradio interface
 try:
-    demo = create_ui()
+    demo = get_demo()
     logger.info("✅ Gradio interface created successfully")
 except Exception as e:
-    logger.error(f"❌ Failed to create UI: {e}")
+    logger.error("❌ Failed to create UI: %s", e)
     raise
 
 # Launch the app
@@ -47,8 +83,7 @@ if __name__ == "__main__":
     # Hugging Face Spaces configuration - minimal parameters for compatibility
     demo.launch(
         server_name="0.0.0.0",
-        server_port=7860
+        server_port=int(os.getenv("GRADIO_SERVER_PORT", "7860"))
     )
     
     logger.info("✅ App launched successfully!")
-
@@ -15,9 +15,13 @@ Author: Enhanced Agentic RAG Team
 Version: 4.0
 """
 
+import os
+import re
+import time
+import jinja2
 import gradio as gr
 from typing import List, Tuple, Dict
-from datetime import datetime
+from operator import attrgetter
 from collections import Counter
 
 # Import the core system
@@ -27,51 +31,214 @@ from agentic_rag_app import AgenticRAG, logger
 # 🎨 Custom CSS
 # ═══════════════════════════════════════════════════════════════════
 
-CUSTOM_CSS = """
-/* Global Styles */
-.gradio-container {
-    font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-}
-
-/* Header Styling */
-.app-header {
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    padding: 2rem;
-    border-radius: 12px;
-    margin-bottom: 2rem;
-    color: white;
-    box-shadow: 0 8px 32px rgba(102, 126, 234, 0.3);
-}
-
-/* Status Cards */
-.status-card {
-    background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-    padding: 1.5rem;
-    border-radius: 10px;
-    border-left: 4px solid #667eea;
-    margin: 1rem 0;
-    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-}
-
-.status-success {
-    border-left-color: #10b981;
-    background: linear-gradient(135deg, #d1fae5 0%, #a7f3d0 100%);
-}
-
-.status-error {
-    border-left-color: #ef4444;
-    background: linear-gradient(135deg, #fee2e2 0%, #fecaca 100%);
-}
-
-.metric {
-    display: inline-block;
-    padding: 0.5rem 1rem;
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-    color: white;
-    border-radius: 20px;
-    font-weight: 600;
-    margin: 0.25rem;
-}
+def _minify_css(css: str) -> str:
+    """Drop comments and collapse whitespace."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    # ':' only inside declaration blocks: in selectors ".a :hover" != ".a:hover"
+    css = re.sub(r'\{[^{}]*\}', lambda block: re.sub(r'\s*:\s*', ':', block.group()), css)
+    return re.sub(r'\s+', ' ', css).strip()
+
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'app.css')
+with open(CSS_PATH, encoding='utf-8') as css_file:
+    CUSTOM_CSS = _minify_css(css_file.read())
+
+# ═══════════════════════════════════════════════════════════════════
+# 🧩 Status Card Templates (parsed once at import, autoescaped)
+# ═══════════════════════════════════════════════════════════════════
+
+_TEMPLATES = jinja2.Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True)
+
+INIT_SUCCESS_TPL = _TEMPLATES.from_string("""
+<div class="status-card status-success">
+    <h2>✅ System Initialized Successfully!</h2>
+    <p style="margin-top: 1rem; font-size: 1.1rem;">
+        🤖 <strong>Agentic RAG System is ready!</strong>
+    </p>
+    <div style="margin-top: 1rem;">
+        <div class="metric">✅ OpenAI Connected</div>
+        {% if tavily %}
+        <div class="metric">✅ Tavily Connected</div>
+        {% endif %}
+    </div>
+    <p style="margin-top: 1rem; color: #059669;">
+        ⚡ You can now upload documents and start chatting!
+    </p>
+</div>
+""")
+
+INIT_ERROR_TPL = _TEMPLATES.from_string("""
+<div class="status-card status-error">
+    <h3>❌ Initialization Failed</h3>
+    <p><strong>Error:</strong> {{ error }}</p>
+    <p style="margin-top: 0.5rem;">
+        💡 Check your API key and try again.
+    </p>
+</div>
+""")
+
+DOC_SUCCESS_TPL = _TEMPLATES.from_string("""
+<div class="status-card status-success">
+    <h2>✅ Document Processed Successfully!</h2>
+    <div style="margin-top: 1rem;">
+        <div class="metric">📄 {{ filename }}</div>
+        <div class="metric">📋 {{ format }}</div>
+        <div class="metric">📊 {{ chunks }} chunks</div>
+    </div>
+    <p style="margin-top: 1rem; color: #059669;">
+        ⚡ Ready to answer questions about this document!
+    </p>
+</div>
+""")
+
+DOC_ERROR_TPL = _TEMPLATES.from_string("""
+<div class="status-card status-error">
+    <h3>❌ Processing Failed</h3>
+    <p>{{ error or 'Unknown error' }}</p>
+</div>
+""")
+
+HISTORY_LOADED_TPL = _TEMPLATES.from_string("""
+<div class="status-card status-success">
+    <h3>📂 History Loaded</h3>
+    <p>✅ Restored <strong>{{ count }}</strong> conversations</p>
+</div>
+""")
+
+FEEDBACK_TPL = _TEMPLATES.from_string("""
+<div class='status-card status-success'>
+    <strong>{{ emoji }} Feedback recorded!</strong>
+    <p>Thank you for helping improve the system.</p>
+</div>
+""")
+
+EXPORT_SUCCESS_TPL = _TEMPLATES.from_string("""
+<div class='status-card status-success'>
+    ✅ Logs exported to interaction_logs.json
+    <br><small>Time: {{ time }}</small>
+</div>
+""")
+
+THINKING_HTML = "<div class='status-card'>🤔 Thinking...</div>"
+
+ERROR_TPL = _TEMPLATES.from_string("<div class='status-card status-error'>Error: {{ error }}</div>")
+
+# ═══════════════════════════════════════════════════════════════════
+# 🏷️ Header & Footer
+# ═══════════════════════════════════════════════════════════════════
+
+_HEADER_HTML = """
+<div class="app-header">
+    <h1>🤖 Enhanced Agentic RAG System v4.0</h1>
+    <p>Multi-format document support • Secure API management • Modern LangChain</p>
+    <div style="margin-top: 0.5rem;">
+        <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📄 PDF</span>
+        <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📝 DOCX</span>
+        <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📃 TXT</span>
+        <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📡 PCAP</span>
+    </div>
+</div>
+"""
+
+_FOOTER_MD = """
+---
+<div style="text-align: center; color: #666;">
+    <p><strong>Enhanced Agentic RAG System v4.0</strong></p>
+    <p>Built with LangChain, FAISS, OpenAI, Gradio</p>
+    <p style="font-size: 0.8rem;">Production-ready • Secure • Multi-format • Modern Architecture</p>
+</div>
+"""
+
+# ═══════════════════════════════════════════════════════════════════
+# 📖 Help Content
+# ═══════════════════════════════════════════════════════════════════
+
+HELP_MD = """
+## 🎯 User Guide
+
+### Quick Start (3 Steps)
+
+1. **Initialize System**: Enter your OpenAI API key in the setup screen
+2. **Upload Document**: Go to "Document Upload" tab and process your file
+3. **Start Chatting**: Ask questions in the "Interactive Chat" tab
+
+### Supported File Formats
+
+| Format | Extension | Use Case |
+|--------|-----------|----------|
+| **PDF** | .pdf | Research papers, reports, manuals |
+| **Word** | .docx, .doc | Business documents, proposals |
+| **Text** | .txt | Code, logs, plain text |
+| **PCAP** | .pcap, .pcapng | Network traffic analysis |
+
+### Available Tools
+
+The AI agent automatically selects from these tools:
+
+- **DocumentSearch** 📚 - Search uploaded documents
+- **Calculator** 🧮 - Perform mathematical calculations
+- **TextAnalysis** 📝 - Analyze text for keywords, word count
+- **DataFormatter** 📊 - Format lists and bullet points
+- **WebSearch** 🌐 - Search the internet (requires Tavily API key)
+- **Wikipedia** 📖 - Look up factual information
+
+### Features
+
+- **🧠 Intelligent Agent**: Uses ReAct (Reasoning + Acting) pattern
+- **💾 Persistent Memory**: All conversations automatically saved
+- **🔍 Transparent Reasoning**: See exactly how the agent thinks
+- **👍👎 Feedback System**: Rate responses to improve quality
+- **📊 Analytics**: Track usage patterns and satisfaction
+- **🔐 Secure**: API keys stored in memory only
+
+### Tips for Best Results
+
+- Be specific in your questions
+- Reference the document explicitly when needed
+- Use follow-up questions to dig deeper
+- Provide feedback to help the system learn
+- Check agent reasoning to understand the process
+
+### Troubleshooting
+
+**Problem**: "System not initialized"
+- **Solution**: Go back to setup and enter your API key
+
+**Problem**: "No document uploaded"
+- **Solution**: Upload a document in the "Document Upload" tab first
+
+**Problem**: Slow responses
+- **Solution**: Large documents take longer to process
+
+**Problem**: API errors
+- **Solution**: Check your API key is valid and has credits
+
+### Getting API Keys
+
+**OpenAI API Key** (Required):
+1. Visit [https://platform.openai.com](https://platform.openai.com)
+2. Sign up or log in
+3. Go to API Keys section
+4. Create new secret key
+5. Copy and paste into the setup screen
+
+**Tavily API Key** (Optional):
+1. Visit [https://tavily.com](https://tavily.com)
+2. Sign up for an account
+3. Get your API key from dashboard
+4. Enter in setup screen for web search capability
+
+### Privacy & Security
+
+- API keys are stored in memory only
+- Keys are never written to disk
+- Conversations saved locally in JSON format
+- No data sent to third parties except OpenAI/Tavily APIs
+
+### Support
+
+For issues, check the logs in `agentic_rag.log` or export conversation logs for analysis.
 """
 
 # ═══════════════════════════════════════════════════════════════════
@@ -80,6 +247,37 @@ CUSTOM_CSS = """
 
 rag_system = None
 
+
+# Visibility updates carry no per-call state, so build them once
+_SHOW = gr.update(visible=True)
+_HIDE = gr.update(visible=False)
+
+# (query, response) pair of an InteractionLog, as Gradio's tuple-format Chatbot expects
+_query_response = attrgetter('query', 'response')
+
+# One tool badge in the reasoning panel
+_TOOL_SPAN = '<span style="background: #667eea; color: white; padding: 0.25rem 0.5rem; border-radius: 4px; margin: 0.25rem;">{}</span> '.format
+
+# Statistics grid cards: (gradient start, gradient end, label), in display order
+STATS_METRICS = (
+    ('#667eea', '#764ba2', 'Total Conversations'),
+    ('#10b981', '#059669', '👍 Positive'),
+    ('#f59e0b', '#d97706', '🛠️ Tools Used'),
+    ('#3b82f6', '#2563eb', 'Satisfaction'),
+)
+_METRIC_CARD = (
+    '<div style="padding: 1rem; background: linear-gradient(135deg, {} 0%, {} 100%); border-radius: 8px; color: white; text-align: center;">'
+    '<div style="font-size: 2rem; font-weight: bold;">{}</div>'
+    '<div style="font-size: 0.9rem;">{}</div>'
+    '</div>'
+).format
+
+# One list item of the statistics tool breakdown
+_TOOL_COUNT_ITEM = '<li><strong>{}:</strong> {} times</li>'.format
+
+# Last rendered statistics card: (system id, history version) -> HTML
+_stats_cache: Dict[Tuple[int, int], str] = {}
+
 # ═══════════════════════════════════════════════════════════════════
 # 🎨 UI Handler Functions
 # ═══════════════════════════════════════════════════════════════════
@@ -88,56 +286,32 @@ def initialize_system(openai_key: str, tavily_key: str = ""):
     """Initialize the RAG system with API keys."""
     global rag_system
     
-    if not openai_key or len(openai_key.strip()) < 10:
+    # Normalize once; a whitespace-only Tavily key counts as no key
+    oa = openai_key.strip() if openai_key else ''
+    tv = tavily_key.strip() if tavily_key else ''
+    
+    if len(oa) < 10:
         return """
         <div class="status-card status-error">
             <h3>❌ Invalid API Key</h3>
             <p>Please provide a valid OpenAI API key (starts with 'sk-').</p>
         </div>
-        """, gr.update(visible=False), gr.update(visible=True)
+        """, _HIDE, _SHOW
     
     try:
         api_keys = {
-            'openai': openai_key.strip(),
-            'tavily': tavily_key.strip() if tavily_key else None
+            'openai': oa,
+            'tavily': tv or None
         }
         
         rag_system = AgenticRAG(api_keys=api_keys)
         
-        status_html = """
-        <div class="status-card status-success">
-            <h2>✅ System Initialized Successfully!</h2>
-            <p style="margin-top: 1rem; font-size: 1.1rem;">
-                🤖 <strong>Agentic RAG System is ready!</strong>
-            </p>
-            <div style="margin-top: 1rem;">
-                <div class="metric">✅ OpenAI Connected</div>
-        """
-        
-        if tavily_key:
-            status_html += '<div class="metric">✅ Tavily Connected</div>'
-        
-        status_html += """
-            </div>
-            <p style="margin-top: 1rem; color: #059669;">
-                ⚡ You can now upload documents and start chatting!
-            </p>
-        </div>
-        """
-        
-        return status_html, gr.update(visible=True), gr.update(visible=False)
+        status_html = INIT_SUCCESS_TPL.render(tavily=bool(tv))
+        return status_html, _SHOW, _HIDE
         
     except Exception as e:
-        logger.error(f"Initialization failed: {e}")
-        return f"""
-        <div class="status-card status-error">
-            <h3>❌ Initialization Failed</h3>
-            <p><strong>Error:</strong> {str(e)}</p>
-            <p style="margin-top: 0.5rem;">
-                💡 Check your API key and try again.
-            </p>
-        </div>
-        """, gr.update(visible=False), gr.update(visible=True)
+        logger.error("Initialization failed: %s", e)
+        return INIT_ERROR_TPL.render(error=e), _HIDE, _SHOW
 
 
 def load_conversation_history() -> Tuple[List[Tuple[str, str]], str]:
@@ -152,19 +326,12 @@ def load_conversation_history() -> Tuple[List[Tuple[str, str]], str]:
             return [], "<div class='status-card'>No previous conversations found.</div>"
         
         # Gradio 4.16.0 uses tuple format
-        chat_history = [(h.query, h.response) for h in history]
-        
-        status_msg = f"""
-        <div class="status-card status-success">
-            <h3>📂 History Loaded</h3>
-            <p>✅ Restored <strong>{len(history)}</strong> conversations</p>
-        </div>
-        """
+        chat_history = list(map(_query_response, history))
         
-        return chat_history, status_msg
+        return chat_history, HISTORY_LOADED_TPL.render(count=len(history))
         
     except Exception as e:
-        return [], f"<div class='status-card status-error'>Error: {str(e)}</div>"
+        return [], ERROR_TPL.render(error=e)
 
 
 def process_document_ui(file):
@@ -179,45 +346,29 @@ def process_document_ui(file):
         result = rag_system.process_document(file.name)
         
         if result['success']:
-            return f"""
-            <div class="status-card status-success">
-                <h2>✅ Document Processed Successfully!</h2>
-                <div style="margin-top: 1rem;">
-                    <div class="metric">📄 {result['filename']}</div>
-                    <div class="metric">📋 {result['format']}</div>
-                    <div class="metric">📊 {result['chunks']} chunks</div>
-                </div>
-                <p style="margin-top: 1rem; color: #059669;">
-                    ⚡ Ready to answer questions about this document!
-                </p>
-            </div>
-            """
-        else:
-            return f"""
-            <div class="status-card status-error">
-                <h3>❌ Processing Failed</h3>
-                <p>{result.get('error', 'Unknown error')}</p>
-            </div>
-            """
+            return DOC_SUCCESS_TPL.render(**result)
+        return DOC_ERROR_TPL.render(error=result.get('error'))
     except Exception as e:
-        logger.error(f"Document processing error: {e}")
-        return f"<div class='status-card status-error'>Error: {str(e)}</div>"
+        logger.error("Document processing error: %s", e)
+        return ERROR_TPL.render(error=e)
 
 
-def chat_ui(message: str, history: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], Dict]:
+def chat_ui(message: str, history: List[Tuple[str, str]],
+            show_reasoning: bool = False) -> Tuple[List[Tuple[str, str]], Dict]:
     """Handle chat interaction."""
-    if not rag_system:
-        history.append((message, "❌ Please initialize the system first! Go to the setup tab and enter your API key."))
+    # Whitespace-only input: nothing to send, nothing to show
+    if not message or not message.strip():
         return history, {}
     
-    if not message.strip():
+    if not rag_system:
+        history.append((message, "❌ Please initialize the system first! Go to the setup tab and enter your API key."))
         return history, {}
     
+    chat = rag_system.chat
     try:
-        result = rag_system.chat(message)
-        response = result.get('response', 'No response')
-        metadata = result.get('metadata', {})
-        sources = result.get('sources', [])
+        result = chat(message, return_reasoning=show_reasoning)
+        response, metadata = result.get('response', 'No response'), result.get('metadata') or {}
+        sources = result.get('sources')
         
         if 'conversation_id' in result:
             metadata['conversation_id'] = result['conversation_id']
@@ -229,7 +380,7 @@ def chat_ui(message: str, history: List[Tuple[str, str]]) -> Tuple[List[Tuple[st
         history.append((message, response))
         return history, metadata
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error("Chat error: %s", e)
         history.append((message, f"❌ Error: {str(e)}"))
         return history, {}
 
@@ -244,14 +395,12 @@ def display_agent_reasoning(metadata: Dict) -> str:
     sources = metadata.get('sources', [])
     grounding_info = metadata.get('grounding_info', {})
     
-    output = '<div class="status-card">'
-    output += '<h3>🤖 Agent Reasoning</h3>'
+    parts = ['<div class="status-card">', '<h3>🤖 Agent Reasoning</h3>']
     
     if tools_used:
-        output += '<p><strong>Tools Used:</strong> '
-        for tool in tools_used:
-            output += f'<span style="background: #667eea; color: white; padding: 0.25rem 0.5rem; border-radius: 4px; margin: 0.25rem;">{tool}</span> '
-        output += '</p>'
+        parts.append('<p><strong>Tools Used:</strong> ')
+        parts.append(''.join(map(_TOOL_SPAN, tools_used)))
+        parts.append('</p>')
     
     # Display grounding status if WebSearch was used
     if 'WebSearch' in tools_used:
@@ -262,41 +411,45 @@ def display_agent_reasoning(metadata: Dict) -> str:
         grounding_status = "✅ Grounded" if is_grounded else "⚠️ Not Fully Grounded"
         grounding_color = "#10b981" if is_grounded else "#f59e0b"
         
-        output += f'<p style="margin-top: 0.5rem;"><strong>Grounding Status:</strong> '
-        output += f'<span style="color: {grounding_color}; font-weight: bold;">{grounding_status}</span>'
+        parts.append('<p style="margin-top: 0.5rem;"><strong>Grounding Status:</strong> ')
+        parts.append(f'<span style="color: {grounding_color}; font-weight: bold;">{grounding_status}</span>')
         if citation_count > 0:
-            output += f' <span style="color: #6b7280;">({citation_count} citation(s))</span>'
-        output += '</p>'
+            parts.append(f' <span style="color: #6b7280;">({citation_count} citation(s))</span>')
+        parts.append('</p>')
     
     if agent_reasoning:
-        output += '<div style="margin-top: 1rem;">'
+        parts.append('<div style="margin-top: 1rem;">')
         for i, step in enumerate(agent_reasoning, 1):
             tool = step.get('tool', 'Unknown')
             tool_input = step.get('input', '')
             tool_output = step.get('output', '')
             
-            output += f'<div style="margin: 0.5rem 0; padding: 0.75rem; background: white; border-radius: 4px; border-left: 3px solid #667eea;">'
-            output += f'<strong>Step {i}: {tool}</strong><br>'
-            output += f'<em>Input:</em> {tool_input}<br>'
-            output += f'<em>Output:</em> {tool_output}'
-            output += '</div>'
-        output += '</div>'
+            parts.append(
+                '<div style="margin: 0.5rem 0; padding: 0.75rem; background: white; border-radius: 4px; border-left: 3px solid #667eea;">'
+                f'<strong>Step {i}: {tool}</strong><br>'
+                f'<em>Input:</em> {tool_input}<br>'
+                f'<em>Output:</em> {tool_output}'
+                '</div>'
+            )
+        parts.append('</div>')
     
     # Display sources section
     if sources:
-        output += '<div style="margin-top: 1.5rem; padding-top: 1rem; border-top: 2px solid #e5e7eb;">'
-        output += '<h4 style="margin-bottom: 0.5rem;">📚 Web Search Sources</h4>'
+        parts.append('<div style="margin-top: 1.5rem; padding-top: 1rem; border-top: 2px solid #e5e7eb;">')
+        parts.append('<h4 style="margin-bottom: 0.5rem;">📚 Web Search Sources</h4>')
         for i, source in enumerate(sources, 1):
             title = source.get('title', 'Untitled')
             url = source.get('url', '')
-            output += f'<div style="margin: 0.5rem 0; padding: 0.5rem; background: #f9fafb; border-radius: 4px;">'
-            output += f'<strong>Source {i}:</strong> {title}<br>'
-            output += f'<a href="{url}" target="_blank" style="color: #667eea; text-decoration: none;">🔗 {url}</a>'
-            output += '</div>'
-        output += '</div>'
+            parts.append(
+                '<div style="margin: 0.5rem 0; padding: 0.5rem; background: #f9fafb; border-radius: 4px;">'
+                f'<strong>Source {i}:</strong> {title}<br>'
+                f'<a href="{url}" target="_blank" style="color: #667eea; text-decoration: none;">🔗 {url}</a>'
+                '</div>'
+            )
+        parts.append('</div>')
     
-    output += '</div>'
-    return output
+    parts.append('</div>')
+    return ''.join(parts)
 
 
 def handle_feedback(conversation_id: int, feedback_type: str):
@@ -306,13 +459,7 @@ def handle_feedback(conversation_id: int, feedback_type: str):
     
     if conversation_id is not None and conversation_id >= 0:
         rag_system.add_feedback(conversation_id, feedback_type)
-        emoji = "👍" if feedback_type == "positive" else "👎"
-        return f"""
-        <div class='status-card status-success'>
-            <strong>{emoji} Feedback recorded!</strong>
-            <p>Thank you for helping improve the system.</p>
-        </div>
-        """
+        return FEEDBACK_TPL.render(emoji="👍" if feedback_type == "positive" else "👎")
     
     return "<div class='status-card'>No active conversation</div>"
 
@@ -324,12 +471,7 @@ def export_logs_ui():
     
     success = rag_system.export_logs()
     if success:
-        return f"""
-        <div class='status-card status-success'>
-            ✅ Logs exported to interaction_logs.json
-            <br><small>Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</small>
-        </div>
-        """
+        return EXPORT_SUCCESS_TPL.render(time=time.strftime('%Y-%m-%d %H:%M:%S'))
     return "<div class='status-card status-error'>❌ Export failed</div>"
 
 
@@ -338,7 +480,7 @@ def clear_memory_ui():
     if not rag_system:
         return [], "<div class='status-card status-error'>System not initialized</div>"
     
-    rag_system.clear_memory()
+    rag_system.clear_memory(aggressive=True)
     return [], "<div class='status-card'>🗑️ Memory cleared successfully</div>"
 
 
@@ -347,69 +489,55 @@ def get_conversation_stats() -> str:
     if not rag_system:
         return "<div class='status-card'>System not initialized</div>"
     
+    # Nothing changed since the last refresh: reuse the rendered card
+    key = (id(rag_system), rag_system.memory_manager.version)
+    if key in _stats_cache:
+        return _stats_cache[key]
+    
     history = rag_system.get_conversation_history(num_interactions=100)
     
     if not history:
         return "<div class='status-card'>No conversations yet</div>"
     
+    # One pass over the history for both feedback and tool counts
     total = len(history)
-    with_feedback = sum(1 for h in history if h.feedback)
-    positive = sum(1 for h in history if h.feedback == 'positive')
-    negative = sum(1 for h in history if h.feedback == 'negative')
-    
-    all_tools = []
+    feedback_counts = Counter()
+    tool_counts = Counter()
     for h in history:
-        all_tools.extend(h.tools_used)
-    tool_counts = Counter(all_tools)
+        feedback_counts[h.feedback] += 1
+        tool_counts.update(h.tools_used)
+    positive = feedback_counts['positive']
+    negative = feedback_counts['negative']
+    with_feedback = positive + negative
     
-    satisfaction_rate = (positive / with_feedback * 100) if with_feedback > 0 else 0
+    satisfaction_rate = (positive * 100) // with_feedback if with_feedback else 0
     
-    output = '<div class="status-card">'
-    output += '<h2>📊 Conversation Statistics</h2>'
+    parts = ['<div class="status-card">', '<h2>📊 Conversation Statistics</h2>']
     
     # Main metrics
-    output += '<div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(150px, 1fr)); gap: 1rem; margin: 1rem 0;">'
-    
-    output += f'''
-    <div style="padding: 1rem; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 8px; color: white; text-align: center;">
-        <div style="font-size: 2rem; font-weight: bold;">{total}</div>
-        <div style="font-size: 0.9rem;">Total Conversations</div>
-    </div>
-    '''
+    parts.append('<div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(150px, 1fr)); gap: 1rem; margin: 1rem 0;">')
     
-    output += f'''
-    <div style="padding: 1rem; background: linear-gradient(135deg, #10b981 0%, #059669 100%); border-radius: 8px; color: white; text-align: center;">
-        <div style="font-size: 2rem; font-weight: bold;">{positive}</div>
-        <div style="font-size: 0.9rem;">👍 Positive</div>
-    </div>
-    '''
-    
-    output += f'''
-    <div style="padding: 1rem; background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%); border-radius: 8px; color: white; text-align: center;">
-        <div style="font-size: 2rem; font-weight: bold;">{len(tool_counts)}</div>
-        <div style="font-size: 0.9rem;">🛠️ Tools Used</div>
-    </div>
-    '''
-    
-    output += f'''
-    <div style="padding: 1rem; background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%); border-radius: 8px; color: white; text-align: center;">
-        <div style="font-size: 2rem; font-weight: bold;">{satisfaction_rate:.0f}%</div>
-        <div style="font-size: 0.9rem;">Satisfaction</div>
-    </div>
-    '''
+    values = (total, positive, len(tool_counts), f'{satisfaction_rate}%')
+    parts.extend(
+        _METRIC_CARD(start, end, value, label)
+        for (start, end, label), value in zip(STATS_METRICS, values)
+    )
     
-    output += '</div>'
+    parts.append('</div>')
     
     # Tool Usage
     if tool_counts:
-        output += '<div style="margin-top: 1rem; padding: 1rem; background: white; border-radius: 8px;">'
-        output += '<h3>🛠️ Tool Usage Breakdown:</h3><ul>'
-        for tool, count in tool_counts.most_common():
-            output += f'<li><strong>{tool}:</strong> {count} times</li>'
-        output += '</ul></div>'
+        parts.append('<div style="margin-top: 1rem; padding: 1rem; background: white; border-radius: 8px;">')
+        parts.append('<h3>🛠️ Tool Usage Breakdown:</h3><ul>')
+        parts.extend(_TOOL_COUNT_ITEM(tool, count) for tool, count in tool_counts.most_common())
+        parts.append('</ul></div>')
     
-    output += '</div>'
-    return output
+    parts.append('</div>')
+    
+    html = ''.join(parts)
+    _stats_cache.clear()  # Only the current version is ever requested again
+    _stats_cache[key] = html
+    return html
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -419,22 +547,10 @@ def get_conversation_stats() -> str:
 def create_ui():
     """Create the complete Gradio interface."""
     
-    # Create Gradio interface - CSS applied via theme
-    with gr.Blocks(title="🤖 Agentic RAG System") as demo:
+    with gr.Blocks(title="🤖 Agentic RAG System", css=CUSTOM_CSS) as demo:
         
         # Header
-        gr.HTML("""
-        <div class="app-header">
-            <h1>🤖 Enhanced Agentic RAG System v4.0</h1>
-            <p>Multi-format document support • Secure API management • Modern LangChain</p>
-            <div style="margin-top: 0.5rem;">
-                <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📄 PDF</span>
-                <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📝 DOCX</span>
-                <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📃 TXT</span>
-                <span style="background: rgba(255,255,255,0.2); padding: 0.25rem 0.75rem; border-radius: 12px; margin: 0.25rem; display: inline-block;">📡 PCAP</span>
-            </div>
-        </div>
-        """)
+        gr.HTML(_HEADER_HTML)
         
         # API Key Setup Section (initially visible)
         with gr.Group(visible=True) as setup_section:
@@ -532,11 +648,11 @@ def create_ui():
                         
                         with gr.Column(scale=2):
                             gr.Markdown("### 🤖 Agent Reasoning")
+                            show_reasoning = gr.Checkbox(label="🔍 Show step-by-step reasoning", value=False)
                             reasoning_output = gr.HTML(value="<div class='status-card'>Waiting for query...</div>")
                     
-                    # Hidden states
+                    # Hidden state: id of the last answer, for feedback
                     conv_id_state = gr.State(value=-1)
-                    metadata_state = gr.State(value={})
                     
                     # Example questions
                     gr.Markdown("""
@@ -547,23 +663,28 @@ def create_ui():
                     - "What are the main findings in the document?"
                     """)
                     
-                    # Chat interactions
-                    def chat_wrapper(message, history):
-                        new_history, metadata = chat_ui(message, history)
-                        reasoning = display_agent_reasoning(metadata)
-                        conv_id = metadata.get('conversation_id', -1)
-                        return new_history, reasoning, conv_id, metadata
+                    # Chat interactions (Send and Enter share one queue, so turns never overlap)
+                    def chat_wrapper(message, history, with_steps):
+                        # Echo the question right away; the answer fills the placeholder
+                        if rag_system and message.strip():
+                            yield history + [(message, None)], THINKING_HTML, -1
+                        new_history, metadata = chat_ui(message, history, with_steps)
+                        yield new_history, display_agent_reasoning(metadata), metadata.get('conversation_id', -1)
                     
                     send_btn.click(
                         fn=chat_wrapper,
-                        inputs=[msg_input, chatbot],
-                        outputs=[chatbot, reasoning_output, conv_id_state, metadata_state]
+                        inputs=[msg_input, chatbot, show_reasoning],
+                        outputs=[chatbot, reasoning_output, conv_id_state],
+                        concurrency_limit=1,
+                        concurrency_id="chat"
                     ).then(lambda: "", outputs=[msg_input])
                     
                     msg_input.submit(
                         fn=chat_wrapper,
-                        inputs=[msg_input, chatbot],
-                        outputs=[chatbot, reasoning_output, conv_id_state, metadata_state]
+                        inputs=[msg_input, chatbot, show_reasoning],
+                        outputs=[chatbot, reasoning_output, conv_id_state],
+                        concurrency_limit=1,
+                        concurrency_id="chat"
                     ).then(lambda: "", outputs=[msg_input])
                     
                     # Feedback
@@ -607,94 +728,10 @@ def create_ui():
                         outputs=[stats_output]
                     )
                 
-                # Help Tab
-                with gr.Tab("❓ Help"):
-                    gr.Markdown("""
-                    ## 🎯 User Guide
-                    
-                    ### Quick Start (3 Steps)
-                    
-                    1. **Initialize System**: Enter your OpenAI API key in the setup screen
-                    2. **Upload Document**: Go to "Document Upload" tab and process your file
-                    3. **Start Chatting**: Ask questions in the "Interactive Chat" tab
-                    
-                    ### Supported File Formats
-                    
-                    | Format | Extension | Use Case |
-                    |--------|-----------|----------|
-                    | **PDF** | .pdf | Research papers, reports, manuals |
-                    | **Word** | .docx, .doc | Business documents, proposals |
-                    | **Text** | .txt | Code, logs, plain text |
-                    | **PCAP** | .pcap, .pcapng | Network traffic analysis |
-                    
-                    ### Available Tools
-                    
-                    The AI agent automatically selects from these tools:
-                    
-                    - **DocumentSearch** 📚 - Search uploaded documents
-                    - **Calculator** 🧮 - Perform mathematical calculations
-                    - **TextAnalysis** 📝 - Analyze text for keywords, word count
-                    - **DataFormatter** 📊 - Format lists and bullet points
-                    - **WebSearch** 🌐 - Search the internet (requires Tavily API key)
-                    - **Wikipedia** 📖 - Look up factual information
-                    
-                    ### Features
-                    
-                    - **🧠 Intelligent Agent**: Uses ReAct (Reasoning + Acting) pattern
-                    - **💾 Persistent Memory**: All conversations automatically saved
-                    - **🔍 Transparent Reasoning**: See exactly how the agent thinks
-                    - **👍👎 Feedback System**: Rate responses to improve quality
-                    - **📊 Analytics**: Track usage patterns and satisfaction
-                    - **🔐 Secure**: API keys stored in memory only
-                    
-                    ### Tips for Best Results
-                    
-                    - Be specific in your questions
-                    - Reference the document explicitly when needed
-                    - Use follow-up questions to dig deeper
-                    - Provide feedback to help the system learn
-                    - Check agent reasoning to understand the process
-                    
-                    ### Troubleshooting
-                    
-                    **Problem**: "System not initialized"
-                    - **Solution**: Go back to setup and enter your API key
-                    
-                    **Problem**: "No document uploaded"
-                    - **Solution**: Upload a document in the "Document Upload" tab first
-                    
-                    **Problem**: Slow responses
-                    - **Solution**: Large documents take longer to process
-                    
-                    **Problem**: API errors
-                    - **Solution**: Check your API key is valid and has credits
-                    
-                    ### Getting API Keys
-                    
-                    **OpenAI API Key** (Required):
-                    1. Visit [https://platform.openai.com](https://platform.openai.com)
-                    2. Sign up or log in
-                    3. Go to API Keys section
-                    4. Create new secret key
-                    5. Copy and paste into the setup screen
-                    
-                    **Tavily API Key** (Optional):
-                    1. Visit [https://tavily.com](https://tavily.com)
-                    2. Sign up for an account
-                    3. Get your API key from dashboard
-                    4. Enter in setup screen for web search capability
-                    
-                    ### Privacy & Security
-                    
-                    - API keys are stored in memory only
-                    - Keys are never written to disk
-                    - Conversations saved locally in JSON format
-                    - No data sent to third parties except OpenAI/Tavily APIs
-                    
-                    ### Support
-                    
-                    For issues, check the logs in `agentic_rag.log` or export conversation logs for analysis.
-                    """)
+                # Help Tab (content sent only once the tab is opened)
+                with gr.Tab("❓ Help") as help_tab:
+                    help_md = gr.Markdown("")
+                    help_tab.select(fn=lambda: HELP_MD, outputs=[help_md], queue=False)
         
         # Initialize system
         init_button.click(
@@ -703,14 +740,7 @@ def create_ui():
             outputs=[init_status, main_app, setup_section]
         )
         
-        gr.Markdown("""
-        ---
-        <div style="text-align: center; color: #666;">
-            <p><strong>Enhanced Agentic RAG System v4.0</strong></p>
-            <p>Built with LangChain, FAISS, OpenAI, Gradio</p>
-            <p style="font-size: 0.8rem;">Production-ready • Secure • Multi-format • Modern Architecture</p>
-        </div>
-        """)
+        gr.Markdown(_FOOTER_MD)
     
     return demo
 
@@ -0,0 +1,49 @@
+"""MemoryManager under concurrent chat turns and feedback."""
+import threading
+
+import pytest
+
+app = pytest.importorskip("agentic_rag_app")
+
+
+def test_concurrent_turns_get_unique_ids_and_feedback_never_raises(tmp_path):
+    memory = app.MemoryManager(str(tmp_path))
+    ids, errors = [], []
+    
+    def chat_turns():
+        for i in range(300):
+            ids.append(memory.add_interaction(f"q{i}", "r", [], ["Calculator"]))
+    
+    def feedback():
+        for i in range(300):
+            try:
+                memory.add_feedback(i, "positive")
+                memory.get_recent(50)
+            except RuntimeError as e:  # e.g. "deque mutated during iteration"
+                errors.append(e)
+    
+    threads = [threading.Thread(target=chat_turns) for _ in range(4)]
+    threads.append(threading.Thread(target=feedback))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    memory.flush()
+    
+    assert not errors
+    assert sorted(ids) == list(range(1200))
+    assert len(memory.snapshot()) == 1200
+
+
+def test_history_file_is_compacted_once_evicted_records_pile_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.MemoryManager, "MAX_HISTORY", 5)
+    memory = app.MemoryManager(str(tmp_path))
+    for i in range(23):
+        memory.add_interaction(f"q{i}", "r", [], ["Calculator"])
+    memory.flush()
+    
+    lines = memory.history_file.read_bytes().splitlines()
+    assert len(lines) <= 2 * memory.MAX_HISTORY
+    
+    reloaded = app.MemoryManager(str(tmp_path))
+    assert [interaction.query for interaction in reloaded.snapshot()] == [f"q{i}" for i in range(18, 23)]
@@ -0,0 +1,55 @@
+"""PCAP scanning across link types (dpkt path, with Scapy fallback)."""
+import struct
+
+import pytest
+
+dpkt = pytest.importorskip("dpkt")
+app = pytest.importorskip("agentic_rag_app")
+
+Loader = app.MultiFormatDocumentLoader
+
+
+def _udp_packet(src: bytes, dst: bytes) -> bytes:
+    """One IPv4/UDP packet, 10.0.0.x:5353 -> 10.0.0.y:53."""
+    udp = dpkt.udp.UDP(sport=5353, dport=53, data=b"query")
+    udp.ulen = len(udp)
+    ip = dpkt.ip.IP(src=src, dst=dst, p=dpkt.ip.IP_PROTO_UDP, data=udp)
+    ip.len = len(ip)
+    return bytes(ip)
+
+
+def _write_capture(path, linktype: int, frames):
+    with open(path, "wb") as f:
+        writer = dpkt.pcap.Writer(f, linktype=linktype)
+        for timestamp, frame in enumerate(frames):
+            writer.writepkt(frame, ts=timestamp)
+
+
+@pytest.mark.parametrize("linktype, header", [
+    (101, b""),                      # LINKTYPE_RAW
+    (0, struct.pack("=I", 2)),       # DLT_NULL, host byte order
+    (108, struct.pack("!I", 2)),     # DLT_LOOP, network byte order
+])
+def test_non_ethernet_link_types_are_decoded(tmp_path, linktype, header):
+    path = tmp_path / "capture.pcap"
+    _write_capture(path, linktype, [
+        header + _udp_packet(b"\x0a\x00\x00\x01", b"\x0a\x00\x00\x02"),
+        header + _udp_packet(b"\x0a\x00\x00\x02", b"\x0a\x00\x00\x03"),
+    ])
+    
+    total, protocols, ip_addresses, ports = Loader._scan_pcap_dpkt(str(path))
+    
+    assert total == 2
+    assert protocols == {"udp": 2}
+    assert ip_addresses == {"10.0.0.1", "10.0.0.2", "10.0.0.3"}
+    assert ports == {53, 5353}
+
+
+def test_unknown_link_type_falls_back_to_scapy(tmp_path):
+    path = tmp_path / "capture.pcap"
+    _write_capture(path, 147, [b"\x00" * 32])  # LINKTYPE_USER0: nothing dpkt decodes
+    
+    assert Loader._scan_pcap_dpkt(str(path)) is None
+    if app.SCAPY_AVAILABLE:
+        documents, metadata = Loader.load_document(str(path))
+        assert metadata["packets"] == 1
@@ -0,0 +1,26 @@
+"""TextAnalysis keyword extraction matches the split() + isalnum() rule."""
+from collections import Counter
+
+import pytest
+
+app = pytest.importorskip("agentic_rag_app")
+
+
+def _baseline_keywords(text):
+    words = [w.lower() for w in text.split() if len(w) > 4 and w.isalnum()]
+    return [word for word, _ in Counter(words).most_common(5)]
+
+
+@pytest.mark.parametrize("text", [
+    "Network traffic, traffic analysis of network_traffic and packets. Packets packets",
+    "Firewall firewall (firewall) rules: allow allow-list denylist denylist",
+    "Ünïcode wörter wörter plain plain plain",
+])
+def test_punctuated_tokens_are_not_keywords(text):
+    keywords = [m.group().lower() for m in app.KEYWORD_PATTERN.finditer(text)]
+    assert [w for w, _ in Counter(keywords).most_common(5)] == _baseline_keywords(text)
+
+
+def test_analysis_reports_whole_word_keywords():
+    result = app.TextAnalysisTool().analyze("traffic, traffic, traffic, network network")
+    assert "🔑 Top Keywords: network" in result